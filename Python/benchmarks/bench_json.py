@@ -0,0 +1,72 @@
+"""
+JSON 后端基准测试
+
+对比各可用后端（orjson / ujson / 标准库）在真实规模的分片、推文与输出文件上的
+解析与序列化耗时，结果以 JSON 输出
+
+用法: python bench_json.py [--repeat N] [--output 结果文件]
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils import json_utils
+from generators import make_entry_ids, make_tweets, make_output
+
+
+def best_of(func, repeat):
+    """多次运行取最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(repeat):
+    datasets = {"shard": make_entry_ids(10000), "tweets": make_tweets(), "output": make_output()}
+    results = {}
+    for backend in json_utils.available_backends():
+        json_utils.use_backend(backend)
+        results[backend] = {}
+        for name, data in datasets.items():
+            pretty = json_utils.pretty_for(name)
+            encoded = json_utils.dumpb(data, pretty=pretty)
+            results[backend][name] = {
+                "bytes": len(encoded),
+                "pretty": pretty,
+                "loads_ms": round(best_of(lambda: json_utils.loads(encoded), repeat) * 1000, 2),
+                "dumps_ms": round(best_of(lambda: json_utils.dumpb(data, pretty=pretty), repeat) * 1000, 2),
+                "dumps_compact_ms": round(best_of(lambda: json_utils.dumpb(data), repeat) * 1000, 2),
+            }
+    json_utils.use_backend()
+
+    # 相对标准库的加速比
+    for backend, per_file in results.items():
+        for name, r in per_file.items():
+            std = results["json"][name]
+            r["loads_speedup"] = round(std["loads_ms"] / r["loads_ms"], 2)
+            r["dumps_speedup"] = round(std["dumps_ms"] / r["dumps_ms"], 2)
+    return {"repeat": repeat, "default_backend": json_utils.BACKEND, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 后端基准测试")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数（取最短耗时）")
+    parser.add_argument("--output", help="结果写入的JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    report = json_utils.dumps(run(args.repeat), pretty=True)
+    if args.output:
+        Path(args.output).write_text(report, encoding="utf-8")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
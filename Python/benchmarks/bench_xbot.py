@@ -0,0 +1,232 @@
+"""
+X-Bot 处理流水线基准测试
+
+在临时目录中生成分片历史与推文输入，分阶段计时：
+冷启动（导入索引）、热启动、去重集合加载、条目提取吞吐、分片写入与输出合并，
+结果以 JSON 输出，便于多次运行之间对比
+
+用法: python bench_xbot.py [--history N] [--users N] [--tweets-per-user N] [--output 结果文件]
+"""
+import os
+import sys
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils import json_utils
+from utils.log_utils import LogUtils
+from generators import make_tweets, write_tweets, make_output, make_entry_ids, write_shard_history
+
+XBOT_SCRIPT = _project_root / "src" / "X-Bot.py"
+
+
+def load_xbot(workdir):
+    """加载 X-Bot 模块，并将分片、缓存与输出目录指向临时工作目录"""
+    spec = importlib.util.spec_from_file_location("x_bot", XBOT_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["x_bot"] = module
+    spec.loader.exec_module(module)
+    module.Config.SHARD_DIR = os.path.join(workdir, "dataBase", "")
+    module.Config.DEFAULT_OUTPUT_DIR = os.path.join(workdir, "output", "")
+    module.Config.CACHE_DIR = os.path.join(workdir, "cache", "")
+    return module
+
+
+class Timer:
+    """计时上下文"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds else None
+
+
+def bench_startup(args):
+    """冷启动（无索引缓存，分片读入内存并在关闭时写出索引）与热启动（打开已有索引）"""
+    with tempfile.TemporaryDirectory() as workdir:
+        xbot = load_xbot(workdir)
+        write_shard_history(xbot.Config.SHARD_DIR, args.history, xbot.Config.MAX_ENTRIES_PER_SHARD)
+
+        with Timer() as cold:
+            core = xbot.XBotCore()
+        with Timer() as cold_close:
+            core.close()
+        with Timer() as warm:
+            core = xbot.XBotCore()
+        indexed = len(core.processed_ids)
+        core.close()
+
+    return {
+        "history_entries": args.history,
+        "cold_start_s": round(cold.seconds, 4),
+        "cold_close_s": round(cold_close.seconds, 4),
+        "warm_start_s": round(warm.seconds, 4),
+        "indexed_entries": indexed,
+    }
+
+
+def bench_extraction(args):
+    """解析与条目提取吞吐（已处理集合为空时全部条目均为新条目）"""
+    with tempfile.TemporaryDirectory() as workdir:
+        xbot = load_xbot(workdir)
+        tweets = make_tweets(args.users, args.tweets_per_user, args.media, args.special_ratio)
+        data_path = write_tweets(os.path.join(workdir, "tweets.json"), tweets)
+        size = os.path.getsize(data_path)
+
+        with Timer() as parse:
+            count = sum(1 for _ in xbot.FileManager.iter_json_items(data_path))
+        with Timer() as extract:
+            entries = xbot.EntryProcessor().process_items(xbot.FileManager.iter_json_items(data_path), ())
+
+    return {
+        "tweets": count,
+        "entries": len(entries),
+        "input_bytes": size,
+        "parse_s": round(parse.seconds, 4),
+        "parse_mb_per_s": rate(size / 2 ** 20, parse.seconds),
+        "extract_s": round(extract.seconds, 4),
+        "tweets_per_s": rate(count, extract.seconds),
+        "entries_per_s": rate(len(entries), extract.seconds),
+    }
+
+
+def bench_shard_write(args):
+    """分片写入：一次批量追加与多次单条提交（含fsync与分片轮转）"""
+    with tempfile.TemporaryDirectory() as workdir:
+        xbot = load_xbot(workdir)
+        entry_ids = make_entry_ids(args.writes + args.single_writes, seed=7)
+
+        manager = xbot.ShardManager()
+        with Timer() as batch:
+            manager.save_entry_ids(entry_ids[:args.writes])
+            manager.flush()
+        with Timer() as single:
+            for entry_id in entry_ids[args.writes:]:
+                manager.save_entry_ids([entry_id])
+            manager.flush()
+        manager.close()
+
+    return {
+        "batch_entries": args.writes,
+        "batch_s": round(batch.seconds, 4),
+        "batch_us_per_entry": round(batch.seconds / args.writes * 1e6, 2),
+        "single_entries": args.single_writes,
+        "single_s": round(single.seconds, 4),
+        "single_us_per_entry": round(single.seconds / args.single_writes * 1e6, 2) if args.single_writes else None,
+    }
+
+
+def bench_merge(args):
+    """输出合并：向已有大文件多次追加小批条目，再压缩回基础文件"""
+    with tempfile.TemporaryDirectory() as workdir:
+        xbot = load_xbot(workdir)
+        output_path = os.path.join(workdir, "output", "2025-01", "2025-01-01.json")
+        existing = make_output(args.output_size)
+        xbot.OutputStore(output_path)._write_base(existing)
+
+        # 由提取流程生成各轮提交的条目（平均每条推文约2个媒体）
+        total = args.merge_rounds * args.merge_batch
+        tweets = make_tweets(args.users, total // args.users + 1, args.media, args.special_ratio)
+        entries = xbot.EntryProcessor().process_items(tweets, ())[:total]
+        batches = [entries[i:i + args.merge_batch] for i in range(0, len(entries), args.merge_batch)]
+
+        core = xbot.XBotCore()
+
+        with Timer() as commit:
+            for batch in batches:
+                core.commit_entries("bench", output_path, batch)
+        with Timer() as compact:
+            core.close()
+
+    return {
+        "existing_entries": args.output_size,
+        "rounds": args.merge_rounds,
+        "batch_entries": args.merge_batch,
+        "commit_s": round(commit.seconds, 4),
+        "commit_ms_per_round": round(commit.seconds / args.merge_rounds * 1000, 2),
+        "compact_s": round(compact.seconds, 4),
+    }
+
+
+def bench_end_to_end(args):
+    """单日完整处理：在已有分片历史上处理一个推文文件"""
+    with tempfile.TemporaryDirectory() as workdir:
+        xbot = load_xbot(workdir)
+        write_shard_history(xbot.Config.SHARD_DIR, args.history, xbot.Config.MAX_ENTRIES_PER_SHARD)
+        tweets = make_tweets(args.users, args.tweets_per_user, args.media, args.special_ratio)
+        data_path = write_tweets(os.path.join(workdir, "tweets.json"), tweets)
+        output_path = os.path.join(workdir, "output", "day.json")
+
+        with Timer() as total:
+            core = xbot.XBotCore()
+            result = core.process_single_day(data_path, output_path)
+            core.close()
+
+    return {"new_entries": result.new_count, "total_s": round(total.seconds, 4)}
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "extraction": bench_extraction,
+    "shard_write": bench_shard_write,
+    "merge": bench_merge,
+    "end_to_end": bench_end_to_end,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="X-Bot 处理流水线基准测试")
+    parser.add_argument("--history", type=int, default=100000, help="分片历史条目数")
+    parser.add_argument("--users", type=int, default=50, help="推文输入的用户数")
+    parser.add_argument("--tweets-per-user", type=int, default=200, help="每个用户的推文数")
+    parser.add_argument("--media", type=int, default=2, help="每条推文平均媒体数")
+    parser.add_argument("--special-ratio", type=float, default=0.05, help="广播/空间链接推文比例")
+    parser.add_argument("--writes", type=int, default=20000, help="批量写入分片的条目数")
+    parser.add_argument("--single-writes", type=int, default=2000, help="逐条写入分片的条目数")
+    parser.add_argument("--output-size", type=int, default=20000, help="已有输出文件条目数")
+    parser.add_argument("--merge-rounds", type=int, default=20, help="合并轮数（模拟多个用户依次提交）")
+    parser.add_argument("--merge-batch", type=int, default=50, help="每轮合并条目数")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="只运行指定项")
+    parser.add_argument("--output", help="结果写入的JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    # 基准测试期间只保留警告日志
+    LogUtils().get_logger().setLevel(logging.WARNING)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args)
+
+    report = json_utils.dumps({
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "json_backend": json_utils.BACKEND,
+        },
+        "params": {k: v for k, v in vars(args).items() if k not in ("only", "output")},
+        "results": results,
+    }, pretty=True)
+
+    if args.output:
+        Path(args.output).write_text(report, encoding="utf-8")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+基准测试数据生成器
+
+生成与真实数据结构一致的推文输入文件、每日输出条目与 dataBase/ 分片历史
+"""
+import os
+import sys
+import random
+from datetime import datetime
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils import json_utils
+
+BASE_TWEET_ID = 1800000000000000000
+
+
+def make_tweets(users=50, tweets_per_user=100, media_per_tweet=2, special_ratio=0.05, video_ratio=0.1, seed=42):
+    """
+    生成推文列表：与 TypeScript/tweets/user/<name>.json 结构一致
+    :param media_per_tweet: 每条推文平均媒体数（0 ~ 2倍之间均匀分布）
+    :param special_ratio: 携带广播/空间链接的推文比例（两者各半）
+    :param video_ratio: 媒体为视频的比例
+    """
+    rng = random.Random(seed)
+    tweets = []
+    for i in range(users * tweets_per_user):
+        tweet_id = BASE_TWEET_ID + i
+        user = f"user{i % users}"
+        images, videos = [], []
+        for j in range(rng.randint(0, media_per_tweet * 2)):
+            if rng.random() < video_ratio:
+                videos.append(f"https://video.twimg.com/ext_tw_video/{tweet_id}/pu/vid/{j}.mp4?tag=12")
+            else:
+                images.append(f"https://pbs.twimg.com/media/{tweet_id}_{j}.jpg?name=orig")
+
+        expand_urls = []
+        if rng.random() < special_ratio:
+            kind = "broadcasts" if rng.random() < 0.5 else "spaces"
+            expand_urls.append(f"https://x.com/i/{kind}/{tweet_id:x}")
+
+        tweets.append({
+            "user": {"screenName": user, "name": f"用户{i % users}"},
+            "tweetUrl": f"https://x.com/{user}/status/{tweet_id}",
+            "fullText": "测试推文内容 " * rng.randint(1, 20),
+            "publishTime": f"2025-01-{i % 28 + 1:02d}T{i % 24:02d}:{i % 60:02d}:00",
+            "images": images,
+            "videos": videos,
+            "expandUrls": expand_urls
+        })
+    return tweets
+
+
+def write_tweets(path, tweets, ndjson=False):
+    """写入推文输入文件（JSON数组或NDJSON）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        if ndjson:
+            f.writelines(json_utils.dumps(t) + "\n" for t in tweets)
+        else:
+            json_utils.dump(tweets, f, pretty=True)
+    return path
+
+
+def make_output(n=20000, users=50, seed=42):
+    """生成每日输出条目：X-Bot 条目模板"""
+    rng = random.Random(seed)
+    return [{
+        "tweet_id": str(BASE_TWEET_ID + i),
+        "file_name": f"{BASE_TWEET_ID + i}_0.jpg",
+        "user": {"screen_name": f"user{i % users}", "name": f"用户{i % users}"},
+        "media_type": "images",
+        "url": f"https://pbs.twimg.com/media/{BASE_TWEET_ID + i}_0.jpg?name=orig",
+        "read_time": "2025-01-01T00:00:00",
+        "is_uploaded": False,
+        "upload_info": {},
+        "is_downloaded": False,
+        "download_info": {},
+        "full_text": "测试推文内容 " * rng.randint(1, 20),
+        "publish_time": f"2025-01-01T{i % 24:02d}:{i % 60:02d}:00"
+    } for i in range(n)]
+
+
+def make_entry_ids(n, users=50, seed=42):
+    """生成已处理条目ID"""
+    rng = random.Random(seed)
+    return [f"{rng.getrandbits(64):016x}.jpg_user{i % users}_images" for i in range(n)]
+
+
+def write_shard_history(shard_dir, total_entries, per_shard=10000, months=12,
+                        prefix="processed_entries_", pretty=True, seed=42):
+    """
+    生成 dataBase/ 分片历史：按月均分条目，每月写为若干封存JSON分片
+    返回写入的全部条目ID
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    entry_ids = make_entry_ids(total_entries, seed=seed)
+    per_month = -(-total_entries // months)
+    now = datetime.now()
+    for m in range(months):
+        # 从当月往前推，避开当月活动分片
+        year, month = divmod(now.year * 12 + now.month - 2 - m, 12)
+        month_ids = entry_ids[m * per_month:(m + 1) * per_month]
+        for n, start in enumerate(range(0, len(month_ids), per_shard), 1):
+            path = os.path.join(shard_dir, f"{prefix}{year:04d}-{month + 1:02d}-{n:04d}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json_utils.dump(month_ids[start:start + per_shard], f, pretty=pretty)
+    return entry_ids
@@ -1,16 +1,23 @@
 import sys
-import json
 import os
-import subprocess
+import time
+import importlib.util
+import multiprocessing
 import telegram
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 # 将项目根目录添加到模块搜索路径
 _project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(_project_root))
 from utils.log_utils import LogUtils
+from utils import json_utils
+from utils.send_scheduler import SendScheduler, CHANNEL_LIMITS, telegram_permanent
+from utils.message_batcher import MESSAGE_LIMITS, AlertDigest
+from utils.perf_utils import recorder as perf
+from utils.env_utils import env_number
 
 
 # --------------------------
@@ -28,6 +35,25 @@ class PathConfig:
     CONFIG_PATH = Path("../../config/config.json")  # 配置文件路径
     OUT_PUT_DIR = Path("../output/")  # 用户数据目录
     USER_DATA_DIR = Path("../../TypeScript/tweets/user/")  # 用户数据目录
+    ALERT_QUEUE_PATH = Path("../dataBase/alert_retry_queue.jsonl")  # 通知重试队列
+
+
+class ScriptConfig:
+    """同目录脚本模块"""
+    XBOT_SCRIPT = "X-Bot.py"  # X-Bot处理脚本
+    TBOT_SCRIPT = "T-Bot.py"  # T-Bot推送脚本
+
+
+class PoolConfig:
+    """并行处理配置"""
+    MAX_WORKERS = 4  # 并行解析用户数据的工作数，可由环境变量 INI_MAX_WORKERS 覆盖
+    MODE = os.getenv("INI_POOL_MODE", "process")  # 工作池类型: process / thread
+
+
+class SendConfig:
+    """通知发送配置（限速参数见 send_scheduler.CHANNEL_LIMITS）"""
+    MAX_ATTEMPTS = 5  # 单条通知最大尝试次数，失败后写入重试队列
+    DIGEST_WINDOW = 60.0  # 秒：窗口内的用户通知合并为一条摘要，0为逐条发送，可由环境变量 INI_ALERT_DIGEST_WINDOW 覆盖
 
 
 class MsgConfig:
@@ -43,37 +69,81 @@ logger.info("🔄 INI-XT-Bot 初始化完成")
 # --------------------------
 # 通知模块
 # --------------------------
+_bot = None  # 复用的Telegram机器人
+_scheduler = None  # 通知发送调度器
+_digest = None  # 通知摘要
+
+
+def get_alert_scheduler() -> SendScheduler:
+    """获取通知发送调度器（令牌桶限速、429重试、持久化重试队列）"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SendScheduler(
+            queue_path=str(PathConfig.ALERT_QUEUE_PATH),
+            max_attempts=SendConfig.MAX_ATTEMPTS
+        )
+        _scheduler.register_channel("telegram", deliver_telegram_alert, *CHANNEL_LIMITS["telegram"],
+                                    is_permanent=telegram_permanent)
+    return _scheduler
+
+
+def deliver_telegram_alert(chat_id: str, text: str) -> None:
+    """调用Telegram接口发送(静默模式)，失败时抛出异常交由调度器重试"""
+    global _bot
+    if _bot is None:
+        _bot = telegram.Bot(token=EnvConfig.BOT_TOKEN)
+    _bot.send_message(
+        chat_id=chat_id,
+        text=text,
+        disable_notification=True
+    )
+
+
+def get_alert_digest() -> AlertDigest:
+    """获取通知摘要（时间窗口内的用户通知合并为一条消息）"""
+    global _digest
+    if _digest is None:
+        limit, measure = MESSAGE_LIMITS["telegram"]
+        _digest = AlertDigest(deliver_alert_text, SendConfig.DIGEST_WINDOW, limit, measure)
+    return _digest
+
+
 def send_telegram_alert(screen_name: str) -> bool:
     """
-    发送Telegram格式通知
-    返回发送状态: True成功 / False失败
+    加入Telegram格式通知，窗口到期时与窗口内的其他通知合并发送
+    返回状态: True已加入或发送成功 / False失败
     """
     # 检查环境配置
     if not all([EnvConfig.BOT_TOKEN, EnvConfig.CHAT_ID]):
         logger.warning("⏭️ 缺少Telegram环境变量配置，跳过通知发送")
         return False
 
-    try:
-        # 生成格式化消息
-        formatted_msg = MsgConfig.TELEGRAM_ALERT.format(
-            screen_name=screen_name
-        )
+    # 生成格式化消息
+    formatted_msg = MsgConfig.TELEGRAM_ALERT.format(
+        screen_name=screen_name
+    )
+    return get_alert_digest().add(formatted_msg)
 
-        # 初始化机器人
-        bot = telegram.Bot(token=EnvConfig.BOT_TOKEN)
 
-        # 发送消息(静默模式)
-        bot.send_message(
-            chat_id=EnvConfig.CHAT_ID,
-            text=formatted_msg,
-            disable_notification=True
-        )
-        logger.info(f"📢 Telegram通知发送成功: {formatted_msg}")
+def flush_telegram_alerts() -> bool:
+    """发送全部待发通知"""
+    if _digest is None:
         return True
+    return _digest.flush()
 
-    except telegram.error.TelegramError as e:
-        logger.error(f"❌ Telegram消息发送失败: {str(e)}")
+
+def deliver_alert_text(formatted_msg: str) -> bool:
+    """
+    发送一条（可能已合并的）通知
+    返回发送状态: True成功 / False失败
+    """
+    try:
+        if get_alert_scheduler().send("telegram", EnvConfig.CHAT_ID, formatted_msg):
+            logger.info(f"📢 Telegram通知发送成功: {formatted_msg}")
+            return True
+        logger.error(f"❌ Telegram消息发送失败: {formatted_msg}")
         return False
+
     except Exception as e:
         logger.error(f"🚨 通知发送出现意外错误: {str(e)}", exc_info=True)
         return False
@@ -88,8 +158,8 @@ def load_config() -> List[str]:
     返回screen_name列表
     """
     try:
-        with open(PathConfig.CONFIG_PATH, "r") as f:
-            config = json.load(f)
+        with open(PathConfig.CONFIG_PATH, "rb") as f:
+            config = json_utils.load(f)
 
         # 获取原始列表并过滤空值
         raw_users = config.get("screenName", [])
@@ -102,7 +172,7 @@ def load_config() -> List[str]:
     except FileNotFoundError:
         logger.error(f"❌ 配置文件不存在: {PathConfig.CONFIG_PATH}")
         return []
-    except json.JSONDecodeError:
+    except json_utils.JSONDecodeError:
         logger.error(f"❌ 配置文件解析失败: {PathConfig.CONFIG_PATH}")
         return []
     except Exception as e:
@@ -110,143 +180,187 @@ def load_config() -> List[str]:
         return []
 
 
-def trigger_xbot(screen_name: str) -> int:
+def load_script_module(module_name: str, filename: str):
     """
-    处理单个用户数据
-    返回新增条目数
+    按文件路径加载同目录下的脚本模块
+    （脚本文件名含连字符，无法直接import）
     """
-    # 构建数据文件路径
-    data_file = PathConfig.USER_DATA_DIR / f"{screen_name}.json"
-    if not data_file.exists():
-        logger.warning(f"⏭️ 用户数据文件不存在: {data_file}")
-        return 0
+    script_path = Path(__file__).resolve().parent / filename
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
 
-    try:
-        logger.info("🚀 触发X-Bot执行")
 
-        # 执行X-Bot处理（实时显示日志）
-        process = subprocess.Popen(
-            ["python", "-u", "X-Bot.py", str(data_file)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,  # 合并错误输出
-            text=True,
-            bufsize=1  # 启用行缓冲
-        )
+def create_executor():
+    """
+    创建有界工作池
+    进程池依赖fork继承已加载的X-Bot模块，不支持时退回线程池
+    """
+    workers = max(PoolConfig.MAX_WORKERS, 1)
+    if PoolConfig.MODE == "process":
+        if "fork" in multiprocessing.get_all_start_methods():
+            logger.info(f"⚙️ 启用进程池并行处理，工作数: {workers}")
+            return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        logger.warning("⚠️ 当前平台不支持fork，退回线程池")
+    logger.info(f"⚙️ 启用线程池并行处理，工作数: {workers}")
+    return ThreadPoolExecutor(max_workers=workers)
 
-        # 实时打印输出并捕获最后结果
-        output_lines = []
-        for line in iter(process.stdout.readline, ''):
-            line = line.strip()
-            if line:  # 过滤空行
-                # 实时打印到父进程控制台
-                print(f"[X-Bot] {line}", flush=True)
-                output_lines.append(line)
-
-        # 等待进程结束
-        process.wait()
-
-        # 检查退出码
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(
-                process.returncode,
-                process.args,
-                output='\n'.join(output_lines)
-            )
-
-        if output_lines:
-            if len(output_lines) > 1:
-                # 解析倒数第二行作为结果
-                new_count = int(output_lines[-2])
-            else:
-                # 解析倒数第一行作为结果
-                new_count = int(output_lines[-1])
-        else:
-            new_count = 0
-        logger.info(f"✅ X-Bot执行成功，用户 {screen_name} 处理完成，新增 {new_count} 条")
-        return new_count
-
-    except subprocess.CalledProcessError as e:
-        logger.error(f"❌ X-Bot处理 用户 {screen_name} 处理失败: {e.output.splitlines()[-1][:200]}")
-        return 0
-    except Exception as e:
-        logger.error(f"🚨 X-Bot未知错误: {str(e)}")
-        return 0
 
+def timed_call(func, *args):
+    """在工作池中执行函数，返回(结果, 耗时秒数)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
 
-def trigger_tbot() -> bool:
+
+def submit_extractions(pool, xbot, users: List[str]):
     """
-    触发下游处理流程
-    返回执行状态: True成功 / False失败
+    按配置顺序提交用户数据解析任务，并按同样顺序产出
+    同时在途的任务数不超过工作数的两倍，避免候选条目堆积占用内存
     """
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    json_path = PathConfig.OUT_PUT_DIR / f"{current_date[:7]}/{current_date}.json"
+    window = deque()
+    for screen_name in users:
+        data_file = PathConfig.USER_DATA_DIR / f"{screen_name}.json"
+        future = None
+        if data_file.exists():
+            future = pool.submit(timed_call, xbot.extract_candidates, str(data_file))
+        window.append((screen_name, data_file, future))
+
+        if len(window) > max(PoolConfig.MAX_WORKERS, 1) * 2:
+            yield window.popleft()
 
-    if not json_path.exists():
-        logger.warning(f"⏭️ 推送数据文件不存在: {json_path}")
-        return 0
+    while window:
+        yield window.popleft()
+
+
+def trigger_xbot(core, screen_name: str, data_file: Path, future) -> Tuple[Dict, List[Dict]]:
+    """
+    提交单个用户的解析结果（主线程作为唯一写入者去重并写入）
+    返回该用户的处理统计及新增条目
+    """
+    stats = {"screen_name": screen_name, "new_count": 0, "extract_time": 0.0, "commit_time": 0.0, "notify_time": 0.0}
+    if future is None:
+        logger.warning(f"⏭️ 用户数据文件不存在: {data_file}")
+        return stats, []
 
     try:
-        logger.info("🚀 触发T-Bot执行")
-
-        # 执行T-Bot处理（实时显示日志）
-        process = subprocess.Popen(
-            ["python", "-u", "T-Bot.py", str(json_path)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
+        candidates, stats["extract_time"] = future.result()
+
+        logger.info("🚀 触发X-Bot执行")
+        start = time.perf_counter()
+        result = core.commit_entries(str(data_file), core.today_output_path(), candidates, dedup=True)
+        stats["commit_time"] = time.perf_counter() - start
+        stats["new_count"] = result.new_count
+
+        logger.info(f"✅ X-Bot执行成功，用户 {screen_name} 处理完成，新增 {result.new_count} 条")
+        return stats, result.new_entries
+
+    except Exception as e:
+        logger.error(f"❌ X-Bot处理 用户 {screen_name} 处理失败: {str(e)[:200]}", exc_info=True)
+        return stats, []
+
+
+def log_run_summary(user_stats: List[Dict], wall_time: float) -> None:
+    """输出各用户耗时及整体加速比"""
+    lines = [f"{'用户':<20}{'新增':>8}{'解析(s)':>10}{'写入(s)':>10}{'通知(s)':>10}"]
+    for stats in user_stats:
+        lines.append(
+            f"{stats['screen_name']:<20}{stats['new_count']:>8}"
+            f"{stats['extract_time']:>10.2f}{stats['commit_time']:>10.2f}{stats['notify_time']:>10.2f}"
         )
+    serial_time = sum(s["extract_time"] + s["commit_time"] + s["notify_time"] for s in user_stats)
+    speedup = serial_time / wall_time if wall_time > 0 else 0
+    lines.append(f"串行耗时合计: {serial_time:.2f}s | 实际耗时: {wall_time:.2f}s | 加速比: {speedup:.2f}x")
+    logger.info("⏱️ 用户处理耗时统计\n" + "\n".join(lines))
 
-        # 实时转发输出
-        for line in iter(process.stdout.readline, ''):
-            print(f"[T-Bot] {line.strip()}", flush=True)
 
-        # 检查结果
-        process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(
-                process.returncode,
-                process.args
-            )
+def trigger_tbot(tbot, entries: List[Dict]) -> bool:
+    """
+    将本次运行所有用户的新增条目一次性交给T-Bot推送
+    返回执行状态: True成功 / False失败
+    """
+    if not entries:
+        logger.info("⏭️ 本次运行无新增条目，跳过T-Bot")
+        return True
 
+    try:
+        logger.info(f"🚀 触发T-Bot执行，待推送条目: {len(entries)}")
+        tbot.process_items(entries, "本次运行新增条目")
         logger.info("✅ T-Bot执行成功")
         return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"❌ T-Bot执行失败: {str(e)}")
-        return False
     except Exception as e:
-        logger.error(f"🚨 T-Bot未知错误: {str(e)}")
+        logger.error(f"🚨 T-Bot未知错误: {str(e)}", exc_info=True)
         return False
 
 
 # --------------------------
 # 主流程
 # --------------------------
+def load_env_config():
+    """读取数值型环境变量覆盖默认配置，格式错误时记录警告并保留默认值"""
+    PoolConfig.MAX_WORKERS = env_number("INI_MAX_WORKERS", PoolConfig.MAX_WORKERS, minimum=1)
+    SendConfig.DIGEST_WINDOW = env_number("INI_ALERT_DIGEST_WINDOW", SendConfig.DIGEST_WINDOW, minimum=0, cast=float)
+
+
 def main():
     """主处理流程"""
+    load_env_config()
     # 加载配置文件
     users = load_config()
     if not users:
         logger.error("❌ 未获取到有效用户列表，程序终止")
         return
 
-    # 遍历处理用户
-    total_new = 0
-    for screen_name in users:
-        logger.info(f"\n{'=' * 40}\n🔍 开始处理: {screen_name}")
-        new_count = trigger_xbot(screen_name)
+    # 重放上次运行未送达的通知
+    if all([EnvConfig.BOT_TOKEN, EnvConfig.CHAT_ID]):
+        get_alert_scheduler().replay()
 
-        # 处理新增条目
-        if new_count > 0:
-            # 发送即时通知
-            send_telegram_alert(screen_name)
+    # 所有用户共用同一个X-Bot实例（共享已处理条目索引）
+    xbot = load_script_module("x_bot", ScriptConfig.XBOT_SCRIPT)
+    tbot = load_script_module("t_bot", ScriptConfig.TBOT_SCRIPT)
+    perf.start_profiling(xbot.Config.PROFILE_MODE)
+    core = xbot.XBotCore()
 
-        # 触发下游流程
-        if not trigger_tbot():
-            logger.error(f"❌ 触发T-Bot失败 - 用户: {screen_name}")
-
-        total_new += new_count
-        logger.info(f"✅ 处理完成\n{'=' * 40}\n")
+    # 并行解析用户数据，按配置顺序逐个提交
+    total_new = 0
+    user_stats = []
+    run_entries = []  # 本次运行所有用户的新增条目，结束后统一推送
+    wall_start = time.perf_counter()
+    try:
+        with create_executor() as pool:
+            for screen_name, data_file, future in submit_extractions(pool, xbot, users):
+                logger.info(f"\n{'=' * 40}\n🔍 开始处理: {screen_name}")
+                stats, new_entries = trigger_xbot(core, screen_name, data_file, future)
+                user_stats.append(stats)
+                run_entries.extend(new_entries)
+                new_count = stats["new_count"]
+
+                notify_start = time.perf_counter()
+                # 处理新增条目
+                if new_count > 0:
+                    # 发送即时通知
+                    send_telegram_alert(screen_name)
+                stats["notify_time"] = time.perf_counter() - notify_start
+
+                total_new += new_count
+                logger.info(f"✅ 处理完成\n{'=' * 40}\n")
+    finally:
+        core.close()
+        flush_telegram_alerts()
+    log_run_summary(user_stats, time.perf_counter() - wall_start)
+
+    # 触发下游流程（每次运行仅一次，只处理本次新增数据）
+    if not trigger_tbot(tbot, run_entries):
+        logger.error("❌ 触发T-Bot失败")
+
+    if _scheduler is not None:
+        _scheduler.log_metrics()
+
+    # 阶段耗时统计与运行指标（X-Bot 各阶段在主进程中记录）
+    if xbot.Config.WRITE_METRICS:
+        perf.finish("INI-XT-Bot", {"users": len(users), "new_entries": total_new})
 
     # 最终状态汇总
     logger.info(f"🎉 所有用户处理完成！总新增条目: {total_new}")
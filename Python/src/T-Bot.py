@@ -1,11 +1,28 @@
 #!/usr/bin/env python3
 import sys
 import os
-import json
+import html
+import sqlite3
+import hashlib
 import requests
 import telegram
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-import logging
+from requests.adapters import HTTPAdapter
+from telegram.utils.request import Request
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils.log_utils import LogUtils
+from utils import json_utils
+from utils.send_scheduler import SendScheduler, RateLimited, PermanentError, CHANNEL_LIMITS, telegram_permanent
+from utils.output_store import OutputStore, screen_name as entry_screen_name
+from utils.subscriptions import SubscriptionRouter, resolve_destination
+from utils.message_batcher import MESSAGE_LIMITS, pack_messages
+from utils.env_utils import env_number
 
 # --------------------------
 # 配置模块
@@ -13,8 +30,34 @@ import logging
 class Config:
     # 默认输入目录（存放每日推文 JSON 的 output 目录）
     DEFAULT_INPUT_DIR = "../output"
-    # 目标用户
+    # 配置文件（其中的 subscriptions 订阅表定义用户名/关键词/媒体类型到推送目标的路由）
+    CONFIG_PATH = "../../config/config.json"
+    # 目标用户（未配置订阅表时的默认订阅）
     TARGET_USER = "BayeslabsHQ"
+    # 目标用户集合（TBOT_TARGET_USERS 环境变量，逗号分隔；未设置时为 TARGET_USER），一次读取服务多个订阅
+    TARGET_USERS = {name.strip() for name in os.getenv('TBOT_TARGET_USERS', TARGET_USER).split(',') if name.strip()}
+    # 推送渠道
+    CHANNELS = ("telegram", "lark")
+    # Telegram 默认 chat_id（订阅中的推送目标为 telegram 时使用）
+    TELEGRAM_CHAT_ID = -8106040237
+    # 每个渠道的并发发送数（为1时保持渠道内发送顺序）
+    SEND_CONCURRENCY = 1
+    # 合并同一推送目标的多条推文为一条消息（不超过各平台长度上限），减少接口调用
+    COALESCE_MESSAGES = os.getenv('TBOT_COALESCE', '1') == '1'
+    # 每条合并消息最多包含的推文数
+    COALESCE_MAX_TWEETS = 10
+    # 单条消息最大尝试次数（失败的推文由推送记录在下次运行时重试）
+    SEND_MAX_ATTEMPTS = 5
+    # 批量处理时预先解析输出文件的线程数（大于1时解析与发送流水线并行）
+    PARSE_WORKERS = 4
+    # 批量处理时已提交发送、尚未记录结果的文件数上限（限制在途消息占用的内存）
+    MAX_PENDING_FILES = 8
+    # 推送记录（按推文ID与渠道记录送达状态，按月追加日志，跨月封存）
+    LEDGER_DIR = "../dataBase/"
+    LEDGER_PREFIX = "delivery_ledger_"
+    LEDGER_LOG_SUFFIX = ".jsonl"
+    LEDGER_SEALED_SUFFIX = ".sealed.jsonl"
+    LEDGER_LEGACY_PATH = "../dataBase/delivery_ledger.sqlite3"  # 旧版SQLite推送记录，启动时迁移
     
     @classmethod
     def get_env_vars(cls):
@@ -26,65 +69,410 @@ class Config:
 # --------------------------
 # 日志模块
 # --------------------------
-logging.basicConfig(
-    level=logging.DEBUG,  # 改为DEBUG级别以便调试
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# 与其他脚本共用日志器，被INI-XT-Bot进程内调用时不会重复输出
+logger = LogUtils().get_logger()
+logger.info("🔄 T-Bot 初始化完成")
 
 # --------------------------
 # 通知模块
 # --------------------------
+class PartsResult:
+    """超长消息切分后多段发送的合并结果，全部分段成功才视为送达（接口同 Future.result）"""
+
+    def __init__(self, futures):
+        self.futures = futures
+
+    def result(self) -> bool:
+        results = [future.result() for future in self.futures]
+        return all(results)
+
+
+class PackResult:
+    """合并消息中单条原消息的发送结果（接口同 Future.result），future 返回各原消息的发送结果列表"""
+
+    def __init__(self, future, position):
+        self.future = future
+        self.position = position
+
+    def result(self) -> bool:
+        return self.future.result()[self.position]
+
+
 class Notifier:
-    @staticmethod
-    def send_telegram(message: str) -> bool:
-        """发送Telegram消息"""
+    """
+    推送通知：复用长连接客户端，每个渠道一个有界发送通道，
+    多渠道并发发送，单条消息耗时取决于较慢的渠道
+    """
+    _bot = None  # 复用的Telegram机器人（内置连接池）
+    _session = None  # 复用的飞书HTTP会话
+    _lanes = {}  # 渠道 -> 发送线程池
+    _scheduler = None  # 限流感知的发送调度器
+
+    @classmethod
+    def _get_bot(cls, token: str) -> telegram.Bot:
+        """获取复用的Telegram机器人"""
+        if cls._bot is None:
+            request = Request(con_pool_size=Config.SEND_CONCURRENCY + 1)
+            cls._bot = telegram.Bot(token=token, request=request)
+        return cls._bot
+
+    @classmethod
+    def _get_session(cls) -> requests.Session:
+        """获取复用的飞书HTTP会话"""
+        if cls._session is None:
+            cls._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.SEND_CONCURRENCY)
+            cls._session.mount("https://", adapter)
+        return cls._session
+
+    @classmethod
+    def _get_lane(cls, channel: str) -> ThreadPoolExecutor:
+        """获取渠道的发送线程池（并发数为1时保持该渠道内的发送顺序）"""
+        if channel not in cls._lanes:
+            cls._lanes[channel] = ThreadPoolExecutor(
+                max_workers=Config.SEND_CONCURRENCY,
+                thread_name_prefix=f"send-{channel}"
+            )
+        return cls._lanes[channel]
+
+    @classmethod
+    def _get_scheduler(cls) -> SendScheduler:
+        """获取发送调度器（按渠道/会话令牌桶限速，处理429与退避重试）"""
+        if cls._scheduler is None:
+            cls._scheduler = SendScheduler(max_attempts=Config.SEND_MAX_ATTEMPTS)
+            cls._scheduler.register_channel('telegram', cls._deliver_telegram, *CHANNEL_LIMITS['telegram'],
+                                            is_permanent=telegram_permanent)
+            cls._scheduler.register_channel('lark', cls._deliver_lark, *CHANNEL_LIMITS['lark'])
+        return cls._scheduler
+
+    @classmethod
+    def _deliver_telegram(cls, chat_id, message: str) -> None:
+        """调用Telegram接口，限流时抛出的RetryAfter带有retry_after；推文内容按纯文本转义后以HTML模式发送"""
+        bot = cls._get_bot(Config.get_env_vars().get('bot_token'))
+        bot.send_message(chat_id=chat_id, text=html.escape(message, quote=False), parse_mode='HTML')
+
+    @classmethod
+    def _deliver_lark(cls, key, message: str) -> None:
+        """调用飞书Webhook，限流时抛出RateLimited"""
+        webhook = f"https://open.feishu.cn/open-apis/bot/v2/hook/{key}"
+        payload = {
+            "msg_type": "text",
+            "content": {"text": message}
+        }
+        resp = cls._get_session().post(
+            webhook,
+            data=json_utils.dumpb(payload, pretty=json_utils.pretty_for("message")),
+            headers={"Content-Type": "application/json; charset=utf-8"},
+            timeout=10
+        )
+        if resp.status_code == 429:
+            retry_after = resp.headers.get('Retry-After') or resp.headers.get('x-ogw-ratelimit-reset')
+            raise RateLimited("飞书接口限流", float(retry_after) if retry_after else None)
+        if 400 <= resp.status_code < 500:
+            raise PermanentError(f"飞书接口请求错误 {resp.status_code}: {resp.text[:200]}")
+        resp.raise_for_status()
+
+        body = json_utils.loads(resp.content)
+        code = body.get('code', body.get('StatusCode', 0))
+        if code == 11232:
+            raise RateLimited("飞书接口限流")
+        if code:
+            # 其余错误码为参数、签名或机器人配置错误，重试无效
+            raise PermanentError(f"飞书接口返回错误 {code}: {body.get('msg')}")
+
+    @classmethod
+    def send_telegram(cls, message: str, chat_id=None, raise_permanent=False) -> bool:
+        """发送Telegram消息，未指定 chat_id 时发送到默认会话；raise_permanent 见 SendScheduler.send"""
         env = Config.get_env_vars()
         token = env.get('bot_token')
-        chat_id = -8106040237  # 固定 chat_id
+        chat_id = chat_id or Config.TELEGRAM_CHAT_ID
         
         if not token:
             logger.error("未配置 BOT_TOKEN")
             return False
         
-        try:
-            bot = telegram.Bot(token=token)
-            bot.send_message(chat_id=chat_id, text=message, parse_mode='HTML')
+        if cls._get_scheduler().send('telegram', chat_id, message, raise_permanent=raise_permanent):
             logger.info("✅ Telegram 消息发送成功")
             return True
-        except Exception as e:
-            logger.error(f"❌ Telegram 消息发送失败: {e}")
-            return False
+        logger.error("❌ Telegram 消息发送失败")
+        return False
     
-    @staticmethod
-    def send_lark(message: str) -> bool:
-        """发送飞书消息"""
-        key = Config.get_env_vars().get('lark_key')
+    @classmethod
+    def send_lark(cls, message: str, key=None, raise_permanent=False) -> bool:
+        """发送飞书消息，未指定 key 时使用 LARK_KEY；raise_permanent 见 SendScheduler.send"""
+        if key is None:
+            key = Config.get_env_vars().get('lark_key')
         if not key:
             logger.error("未配置 LARK_KEY")
             return False
         
-        webhook = f"https://open.feishu.cn/open-apis/bot/v2/hook/{key}"
-        payload = {
-            "msg_type": "text",
-            "content": {"text": message}
-        }
-        
-        try:
-            resp = requests.post(webhook, json=payload, timeout=10)
-            resp.raise_for_status()
+        if cls._get_scheduler().send('lark', key, message, raise_permanent=raise_permanent):
             logger.info("✅ Feishu 消息发送成功")
             return True
-        except Exception as e:
-            logger.error(f"❌ Feishu 消息发送失败: {e}")
-            return False
+        logger.error("❌ Feishu 消息发送失败")
+        return False
+
+    @classmethod
+    def log_metrics(cls) -> None:
+        """输出发送调度统计"""
+        if cls._scheduler is not None:
+            cls._scheduler.log_metrics()
 
     @staticmethod
     def send_both(message: str) -> tuple[bool, bool]:
         """同时发送到Telegram和Lark"""
-        telegram_success = Notifier.send_telegram(message)
-        lark_success = Notifier.send_lark(message)
-        return telegram_success, lark_success
+        results = Notifier.send_channels(message, ('telegram', 'lark'))
+        return results['telegram'], results['lark']
+
+    @classmethod
+    def submit(cls, message: str, destinations) -> dict:
+        """
+        提交到各推送目标所属渠道的发送通道，返回 {推送目标: Future}
+        推送目标为渠道名（默认会话）或 渠道:目标，如 telegram:<chat_id>
+        """
+        futures = {}
+        for destination in destinations:
+            channel, target = resolve_destination(destination)
+            futures[destination] = cls._get_lane(channel).submit(cls._senders()[channel], message, target)
+        return futures
+
+    @classmethod
+    def _senders(cls) -> dict:
+        """渠道 -> 发送函数"""
+        return {
+            'telegram': cls.send_telegram,
+            'lark': cls.send_lark
+        }
+
+    @classmethod
+    def _send_pack(cls, destination, text: str, parts: list) -> list:
+        """
+        发送合并消息，返回各原消息是否送达
+        合并消息因内容不可重试地失败（如某条推文触发格式错误）时逐条重发，只有出错的推文记为失败
+        """
+        channel, target = resolve_destination(destination)
+        sender = cls._senders()[channel]
+        try:
+            return [sender(text, target, raise_permanent=True)] * len(parts)
+        except Exception as e:
+            logger.warning(f"⚠️ [{destination}] 合并消息被拒绝，逐条重发 {len(parts)} 条: {str(e)}")
+            return [sender(part, target) for part in parts]
+
+    @classmethod
+    def submit_batch(cls, batch) -> list:
+        """
+        提交多条消息，batch 为 [(消息, 推送目标列表)]，按顺序返回每条消息的 {推送目标: Future}
+        启用合并时按推送目标将连续的消息打包为不超过平台上限的合并消息，
+        同一合并消息中的各条共享其发送结果（合并消息被拒绝时逐条重发）；
+        超长消息切分为多段时，全部分段成功才视为送达
+        """
+        if not Config.COALESCE_MESSAGES:
+            return [cls.submit(message, destinations) for message, destinations in batch]
+
+        # 按推送目标归集消息（保持提交顺序），逐个目标打包提交
+        by_destination = {}
+        for index, (message, destinations) in enumerate(batch):
+            for destination in destinations:
+                by_destination.setdefault(destination, []).append(index)
+
+        futures = [{} for _ in batch]
+        calls = 0
+        for destination, indices in by_destination.items():
+            limit, measure = MESSAGE_LIMITS[resolve_destination(destination)[0]]
+            packs = pack_messages([batch[i][0] for i in indices], limit, measure, Config.COALESCE_MAX_TWEETS)
+            for text, members in packs:
+                if len(members) == 1:
+                    future = cls.submit(text, (destination,))[destination]
+                    futures[indices[members[0]]].setdefault(destination, []).append(future)
+                    continue
+                parts = [batch[indices[member]][0] for member in members]
+                lane = cls._get_lane(resolve_destination(destination)[0])
+                future = lane.submit(cls._send_pack, destination, text, parts)
+                for position, member in enumerate(members):
+                    futures[indices[member]].setdefault(destination, []).append(PackResult(future, position))
+            calls += len(packs)
+
+        total = sum(len(destinations) for _, destinations in batch)
+        if calls < total:
+            logger.info(f"📦 消息合并: {total} 次发送合并为 {calls} 次")
+        # 按原消息的推送目标顺序排列结果
+        return [
+            {d: fs[d][0] if len(fs[d]) == 1 else PartsResult(fs[d]) for d in destinations}
+            for (_, destinations), fs in zip(batch, futures)
+        ]
+
+    @classmethod
+    def send_channels(cls, message: str, channels) -> dict:
+        """并发发送到指定推送目标，返回 {推送目标: 是否成功}"""
+        futures = cls.submit(message, channels)
+        return {channel: future.result() for channel, future in futures.items()}
+
+    @classmethod
+    def send_many(cls, batch):
+        """
+        流水线发送多条消息，batch 为 [(消息, 推送目标列表)]
+        按提交顺序逐条产出 {推送目标: 是否成功}
+        """
+        for futures in cls.submit_batch(batch):
+            yield {channel: future.result() for channel, future in futures.items()}
+
+# --------------------------
+# 推送记录
+# --------------------------
+class DeliveryLedger:
+    """按 (推文ID, 渠道) 记录送达状态，重复运行时跳过已送达的推文
+
+    记录追加写入当月日志（每行一条JSON，与分片 .ids 日志一样只追加不改写，
+    随数据仓库提交时只产生新增行）；跨月后将上月日志压缩为每个 (推文, 渠道) 一行的
+    封存文件。启动时全部读入内存
+    """
+
+    DELIVERED = 1
+    FAILED = 0
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or Config.LEDGER_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self._records = {}  # (推文ID, 渠道) -> [状态, 尝试次数, 更新时间]
+        self._handle = None
+        self._month = datetime.now().strftime("%Y-%m")
+
+        for path in self._ledger_files(sealed=True):
+            self._load(path)
+        for path in self._ledger_files(sealed=False):
+            if self._month_of(path) < self._month:
+                self._seal(path)
+            else:
+                self._load(path)
+        self._migrate_legacy()
+
+    def _ledger_files(self, sealed: bool) -> list:
+        """按月份排列的封存文件或当月日志"""
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith(Config.LEDGER_PREFIX) and name.endswith(Config.LEDGER_LOG_SUFFIX)
+            and name.endswith(Config.LEDGER_SEALED_SUFFIX) == sealed
+        )
+
+    @staticmethod
+    def _month_of(path: str) -> str:
+        return os.path.basename(path)[len(Config.LEDGER_PREFIX):].split(".")[0]
+
+    @staticmethod
+    def _read(path: str):
+        """读取日志行，跳过中断写入留下的不完整行"""
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    yield json_utils.loads(line)
+                except ValueError:
+                    continue
+
+    def _apply(self, row: dict) -> None:
+        record = self._records.setdefault((row['tweet_key'], row['channel']), [self.FAILED, 0, ''])
+        record[0] = row['status']
+        record[1] += row.get('attempts', 1)
+        record[2] = row['updated_at']
+
+    def _load(self, path: str) -> None:
+        for row in self._read(path):
+            self._apply(row)
+
+    def _seal(self, log_path: str) -> None:
+        """将跨月的日志压缩为每个 (推文, 渠道) 一行的封存文件"""
+        sealed = {}
+        for row in self._read(log_path):
+            key = (row['tweet_key'], row['channel'])
+            attempts = sealed[key]['attempts'] if key in sealed else 0
+            sealed[key] = {**row, 'attempts': attempts + row.get('attempts', 1)}
+        sealed_path = log_path[:-len(Config.LEDGER_LOG_SUFFIX)] + Config.LEDGER_SEALED_SUFFIX
+        tmp_path = f"{sealed_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.writelines(json_utils.dumpb(row) + b"\n" for row in sealed.values())
+        os.replace(tmp_path, sealed_path)
+        os.remove(log_path)
+        for row in sealed.values():
+            self._apply(row)
+        logger.info(f"🗜️ 推送记录已封存: {sealed_path} (记录数: {len(sealed)})")
+
+    def _migrate_legacy(self) -> None:
+        """导入旧版SQLite推送记录后删除该文件"""
+        legacy_path = Config.LEDGER_LEGACY_PATH
+        if not os.path.exists(legacy_path):
+            return
+        conn = sqlite3.connect(legacy_path)
+        try:
+            rows = conn.execute("SELECT tweet_key, channel, status, attempts, updated_at FROM deliveries").fetchall()
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"⚠️ 旧版推送记录无法读取，已忽略: {e}")
+            rows = []
+        finally:
+            conn.close()
+        self._append([
+            {'tweet_key': key, 'channel': channel, 'status': status, 'attempts': attempts, 'updated_at': updated_at}
+            for key, channel, status, attempts, updated_at in rows
+        ])
+        os.remove(legacy_path)
+        logger.info(f"📦 已迁移旧版推送记录: {len(rows)} 条")
+
+    def _append(self, rows: list) -> None:
+        """追加写入当月日志并应用到内存"""
+        if not rows:
+            return
+        if self._handle is None:
+            path = os.path.join(self.directory, f"{Config.LEDGER_PREFIX}{self._month}{Config.LEDGER_LOG_SUFFIX}")
+            self._handle = open(path, 'ab')
+        self._handle.write(b"".join(json_utils.dumpb(row) + b"\n" for row in rows))
+        self._handle.flush()
+        for row in rows:
+            self._apply(row)
+
+    def pending_channels(self, tweet_key: str, channels) -> list:
+        """返回尚未送达的渠道（未发送过或上次失败）"""
+        return [
+            channel for channel in channels
+            if self._records.get((tweet_key, channel), (self.FAILED,))[0] != self.DELIVERED
+        ]
+
+    def record(self, tweet_key: str, results: dict) -> None:
+        """记录各渠道发送结果"""
+        now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        self._append([
+            {'tweet_key': tweet_key, 'channel': channel,
+             'status': self.DELIVERED if ok else self.FAILED, 'updated_at': now}
+            for channel, ok in results.items()
+        ])
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+_ledger = None
+_router = None
+
+
+def get_ledger() -> DeliveryLedger:
+    """获取进程内共用的推送记录"""
+    global _ledger
+    if _ledger is None:
+        _ledger = DeliveryLedger()
+    return _ledger
+
+
+def get_router() -> SubscriptionRouter:
+    """获取进程内共用的订阅路由，配置文件中没有订阅表时退回 TARGET_USERS 到全部渠道的默认订阅"""
+    global _router
+    if _router is None:
+        _router = SubscriptionRouter.load(Config.CONFIG_PATH, Config.CHANNELS)
+        if not _router:
+            _router = SubscriptionRouter.from_config({"subscriptions": [{
+                "name": "default",
+                "screen_names": sorted(Config.TARGET_USERS),
+                "channels": list(Config.CHANNELS)
+            }]})
+    return _router
 
 # --------------------------
 # 调试工具
@@ -94,8 +482,8 @@ def debug_json_structure(json_path: str) -> None:
     logger.info(f"🔍 调试JSON文件结构: {json_path}")
     
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(json_path, 'rb') as f:
+            data = json_utils.load(f)
         
         logger.info(f"📋 JSON数据类型: {type(data).__name__}")
         
@@ -144,63 +532,124 @@ def debug_json_structure(json_path: str) -> None:
         logger.error(f"❌ 调试文件时出错: {e}")
 
 # --------------------------
-# 核心处理：仅转发指定用户的推文
+# 字段读取（兼容原始推文与X-Bot输出两种结构）
 # --------------------------
-def process_single(json_path: str) -> None:
-    """处理单个JSON文件"""
-    logger.info(f"开始处理: {json_path}")
-    
+def get_screen_name(item: dict) -> str:
+    """读取推文用户名（与输出存储按用户筛选时的规则一致）"""
+    return entry_screen_name(item)
+
+
+def get_full_text(item: dict) -> str:
+    """读取推文正文"""
+    return (item.get('fullText') or item.get('full_text') or '').strip()
+
+
+def get_tweet_url(item: dict) -> str:
+    """读取推文链接，X-Bot输出条目按tweet_id拼接"""
+    tweet_url = (item.get('tweetUrl') or '').strip()
+    if tweet_url:
+        return tweet_url
+    tweet_id = item.get('tweet_id')
+    screen_name = get_screen_name(item)
+    if tweet_id and screen_name:
+        return f"https://x.com/{screen_name}/status/{tweet_id}"
+    return ''
+
+
+def get_media_types(item: dict) -> set:
+    """读取推文包含的媒体类型（X-Bot输出条目为单个 media_type）"""
+    media_type = item.get('media_type')
+    if media_type:
+        return {media_type}
+    return {media_type for media_type in ('images', 'videos') if item.get(media_type)}
+
+
+def get_tweet_key(item: dict, message: str) -> str:
+    """推送记录键：优先使用推文ID，缺失时使用消息内容摘要"""
+    tweet_id = str(item.get('tweet_id') or '')
+    if not tweet_id:
+        tweet_url = get_tweet_url(item)
+        if '/status/' in tweet_url:
+            tweet_id = tweet_url.split('/status/')[1].split('?')[0].split('/')[0]
+    if tweet_id.isdigit():
+        return tweet_id
+    return hashlib.sha1(message.encode('utf-8')).hexdigest()[:16]
+
+
+# --------------------------
+# 核心处理：按订阅路由转发推文
+# --------------------------
+def load_items(json_path: str):
+    """读取单个JSON文件中的推文列表，失败时返回None（可在解析线程中调用）"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # 经由输出存储读取，合并尚未压缩的增量段；订阅均限定用户时只读取这些用户的条目
+        store = OutputStore(json_path)
+        screen_names = get_router().screen_names()
+        data = store.load_users(screen_names) if screen_names is not None else store.load()
     except Exception as e:
         logger.error(f"无法加载 JSON 文件 {json_path}: {e}")
-        return
+        return None
     
     # 处理不同的JSON结构
-    items = []
     if isinstance(data, list):
-        items = data
-    elif isinstance(data, dict) and 'tweets' in data:
-        items = data['tweets']
-    elif isinstance(data, dict) and 'data' in data:
-        items = data['data']
-    else:
-        # 如果是单个推文对象
-        items = [data]
-    
-    logger.info(f"文件中共有 {len(items)} 条推文数据")
-    
-    target_tweets = []
+        return data
+    if isinstance(data, dict) and 'tweets' in data:
+        return data['tweets']
+    if isinstance(data, dict) and 'data' in data:
+        return data['data']
+    # 如果是单个推文对象
+    return [data]
+
+
+def process_single(json_path: str) -> None:
+    """处理单个JSON文件"""
+    logger.info(f"开始处理: {json_path}")
+    items = load_items(json_path)
+    if items is not None:
+        process_items(items, f"文件 {json_path}")
+
+
+def build_outbox(items: list, source: str, inflight: set = None) -> list:
+    """
+    单次扫描按订阅路由推文，返回待发送列表 [(序号, 记录键, 消息, 待发送的推送目标)]
+    同一推文的多个媒体条目只发送一次；inflight 为已提交发送、尚未记录结果的 (记录键, 推送目标)
+    """
+    logger.info(f"{source} 中共有 {len(items)} 条推文数据")
     
-    # 筛选目标用户的推文
+    # 按推文归并媒体条目，汇总每条推文包含的媒体类型
+    tweets = {}
     for i, item in enumerate(items):
         try:
-            user = item.get('user', {})
-            screen_name = user.get('screenName', '').strip()
-            
-            logger.debug(f"推文 {i+1}: 用户 = '{screen_name}'")
-            
-            # 只处理指定用户的推文（不区分大小写）
-            if screen_name and screen_name.lower() == Config.TARGET_USER.lower():
-                target_tweets.append(item)
-                logger.info(f"✅ 匹配到目标用户推文: {screen_name}")
+            key = get_tweet_url(item) or get_full_text(item)
+            if key in tweets:
+                tweets[key][1].update(get_media_types(item))
             else:
-                logger.debug(f"跳过非目标用户推文: '{screen_name}'")
+                tweets[key] = (item, get_media_types(item))
         except Exception as e:
             logger.error(f"处理推文 {i+1} 时出错: {e}")
     
+    router = get_router()
+    target_tweets = []  # (推文, 推送目标)
+    for item, media_types in tweets.values():
+        destinations = router.route(get_screen_name(item), get_full_text(item), media_types)
+        if destinations:
+            target_tweets.append((item, destinations))
+    
     if not target_tweets:
-        logger.info(f"在文件 {json_path} 中未找到用户 '{Config.TARGET_USER}' 的推文")
-        return
+        logger.info(f"在{source} 中未找到匹配订阅的推文")
+        return []
+    
+    logger.info(f"✅ 找到 {len(target_tweets)} 条匹配订阅的推文")
     
-    logger.info(f"找到 {len(target_tweets)} 条来自 '{Config.TARGET_USER}' 的推文")
+    ledger = get_ledger()
+    skipped = 0
+    outbox = []  # (序号, 记录键, 消息, 待发送的推送目标)
     
-    # 发送每条推文
-    for i, tweet in enumerate(target_tweets, 1):
+    # 构建每条推文的消息
+    for i, (tweet, destinations) in enumerate(target_tweets, 1):
         try:
-            full_text = tweet.get('fullText', '').strip()
-            tweet_url = tweet.get('tweetUrl', '').strip()
+            full_text = get_full_text(tweet)
+            tweet_url = get_tweet_url(tweet)
             
             if not full_text and not tweet_url:
                 logger.warning(f"推文 {i} 缺少内容和链接，跳过")
@@ -217,22 +666,52 @@ def process_single(json_path: str) -> None:
             
             message = '\n\n'.join(message_parts)
             
-            logger.info(f"准备发送推文 {i}/{len(target_tweets)}")
-            logger.debug(f"推文内容预览: {message[:100]}...")
-            
-            # 同时发送到两个平台
-            telegram_success, lark_success = Notifier.send_both(message)
+            # 只发送尚未送达（且不在发送途中）的推送目标
+            tweet_key = get_tweet_key(tweet, message)
+            channels = ledger.pending_channels(tweet_key, destinations)
+            if inflight:
+                channels = [c for c in channels if (tweet_key, c) not in inflight]
+            if not channels:
+                skipped += 1
+                logger.debug(f"推文 {i} 已送达，跳过: {tweet_key}")
+                continue
             
-            if telegram_success and lark_success:
-                logger.info(f"✅ 推文 {i} 发送成功（Telegram + Lark）")
-            elif telegram_success or lark_success:
-                platform = "Telegram" if telegram_success else "Lark"
-                logger.warning(f"⚠️ 推文 {i} 部分发送成功（仅 {platform}）")
-            else:
-                logger.error(f"❌ 推文 {i} 发送失败")
+            outbox.append((i, tweet_key, message, channels))
                 
         except Exception as e:
             logger.error(f"处理推文 {i} 时出错: {e}")
+    
+    if skipped:
+        logger.info(f"⏭️ 跳过已送达推文: {skipped} 条")
+    return outbox
+
+
+def record_results(outbox: list, sent) -> None:
+    """按提交顺序逐条记录发送结果"""
+    ledger = get_ledger()
+    for (i, tweet_key, message, _), results in zip(outbox, sent):
+        logger.debug(f"推文 {i} 内容预览: {message[:100]}...")
+        ledger.record(tweet_key, results)
+        
+        succeeded = [c for c, ok in results.items() if ok]
+        if len(succeeded) == len(results):
+            logger.info(f"✅ 推文 {i} 发送成功（{' + '.join(succeeded)}）")
+        elif succeeded:
+            logger.warning(f"⚠️ 推文 {i} 部分发送成功（仅 {', '.join(succeeded)}）")
+        else:
+            logger.error(f"❌ 推文 {i} 发送失败")
+
+
+def process_items(items: list, source: str) -> None:
+    """按订阅路由推文并发送到各推送目标"""
+    outbox = build_outbox(items, source)
+    if not outbox:
+        return
+    
+    # 流水线发送：各渠道并发，按提交顺序逐条记录结果
+    logger.info(f"准备发送推文 {len(outbox)} 条（每渠道并发数: {Config.SEND_CONCURRENCY}）")
+    record_results(outbox, Notifier.send_many([(message, channels) for _, _, message, channels in outbox]))
+    Notifier.log_metrics()
 
 # --------------------------
 # 批量处理
@@ -245,7 +724,7 @@ def batch_process(input_dir: str = None) -> None:
         logger.error(f"输入目录不存在：{base.resolve()}")
         return
     
-    json_files = sorted(base.rglob('*.json'))
+    json_files = OutputStore.discover(base)
     
     if not json_files:
         logger.warning(f"在目录 {base.resolve()} 中未找到任何 JSON 文件")
@@ -253,14 +732,82 @@ def batch_process(input_dir: str = None) -> None:
     
     logger.info(f"找到 {len(json_files)} 个 JSON 文件")
     
+    if Config.PARSE_WORKERS > 1 and len(json_files) > 1:
+        pipeline_process([str(path) for path in json_files])
+        return
     for path in json_files:
         process_single(str(path))
 
+
+def submit_loads(pool: ThreadPoolExecutor, paths: list):
+    """
+    按文件顺序提交解析任务，并按同样顺序产出 (路径, future)
+    同时在途的解析任务不超过线程数的两倍
+    """
+    window = deque()
+    for path in paths:
+        window.append((path, pool.submit(load_items, path)))
+        if len(window) > Config.PARSE_WORKERS * 2:
+            yield window.popleft()
+    while window:
+        yield window.popleft()
+
+
+def pipeline_process(paths: list) -> None:
+    """
+    流水线批量处理：解析线程池预先读取后续文件，主线程按文件顺序路由并立即提交到各渠道的发送通道，
+    发送通道按提交顺序发送，同一会话内保持时间顺序；
+    推送记录仅在主线程中写入，最多积压 MAX_PENDING_FILES 个文件的发送结果
+    """
+    get_router()  # 在主线程中加载订阅表，避免解析线程重复加载
+    inflight = set()  # 已提交发送、尚未记录结果的 (记录键, 推送目标)
+    pending = deque()  # (来源, 待发送列表, 每条消息的 {推送目标: Future})
+    total = 0
+
+    def drain_one():
+        source, outbox, futures = pending.popleft()
+        record_results(outbox, ({c: f.result() for c, f in fs.items()} for fs in futures))
+        for _, tweet_key, _, channels in outbox:
+            inflight.difference_update((tweet_key, c) for c in channels)
+        logger.info(f"📨 {source} 发送结果已记录: {len(outbox)} 条")
+
+    logger.info(f"⚙️ 启用流水线批量处理，解析线程数: {Config.PARSE_WORKERS}")
+    with ThreadPoolExecutor(max_workers=Config.PARSE_WORKERS, thread_name_prefix="parse") as pool:
+        for path, future in submit_loads(pool, paths):
+            items = future.result()
+            if items is None:
+                continue
+            source = f"文件 {path}"
+            outbox = build_outbox(items, source, inflight)
+            if not outbox:
+                continue
+
+            futures = Notifier.submit_batch([(message, channels) for _, _, message, channels in outbox])
+            inflight.update((tweet_key, c) for _, tweet_key, _, channels in outbox for c in channels)
+            pending.append((source, outbox, futures))
+            total += len(outbox)
+            while len(pending) > Config.MAX_PENDING_FILES:
+                drain_one()
+
+    while pending:
+        drain_one()
+    logger.info(f"🏁 流水线批量处理完成，共提交推文 {total} 条")
+    Notifier.log_metrics()
+
 # --------------------------
 # 主入口
 # --------------------------
+def load_env_config():
+    """读取数值型环境变量覆盖默认配置，格式错误时记录警告并保留默认值"""
+    Config.SEND_CONCURRENCY = env_number('TBOT_SEND_CONCURRENCY', Config.SEND_CONCURRENCY, minimum=1)
+    Config.COALESCE_MAX_TWEETS = env_number('TBOT_COALESCE_MAX_TWEETS', Config.COALESCE_MAX_TWEETS, minimum=1)
+    Config.PARSE_WORKERS = env_number('TBOT_PARSE_WORKERS', Config.PARSE_WORKERS, minimum=1)
+    Config.MAX_PENDING_FILES = env_number('TBOT_MAX_PENDING_FILES', Config.MAX_PENDING_FILES, minimum=1)
+
+
 def main():
     """主函数"""
+    load_env_config()
     args = sys.argv[1:]
     
     if len(args) == 1:
@@ -1,6 +1,18 @@
+import io
 import sys
 import json
 import os
+import math
+import re
+import hashlib
+import sqlite3
+import struct
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -8,6 +20,10 @@ from pathlib import Path
 _project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(_project_root))
 from utils.log_utils import LogUtils
+from utils import json_utils
+from utils.output_store import OutputStore, sample_hash
+from utils.perf_utils import recorder as perf
+from utils.env_utils import env_number
 
 
 # --------------------
@@ -17,12 +33,44 @@ class Config:
     # 分片配置
     MAX_ENTRIES_PER_SHARD = 10000  # 单个分片最大条目数
     SHARD_DIR = "../dataBase/"  # 分片存储目录
-    FORMAT_SHARDS = True  # 是否格式化分片文件
     SHARD_PREFIX = "processed_entries_"
+    SHARD_JSON_SUFFIX = ".json"  # 封存分片后缀
+    SHARD_LOG_SUFFIX = ".ids"  # 活动日志分片后缀（每行一个条目ID）
+    FSYNC_BATCH_SIZE = 100  # 日志分片每追加N条执行一次fsync
+    SHARD_JOURNAL = "pending_commit.json"  # 未完成提交的事务日志
+
+    # 派生缓存配置（可由分片重建，不随数据仓库同步）
+    CACHE_DIR = "../cache/"  # 缓存目录（已被 .gitignore 忽略）
+    INDEX_FILE = "processed_index.sqlite3"  # 持久化去重索引
+
+    # 布隆过滤器配置
+    ENABLE_BLOOM_FILTER = True  # 是否在精确查询前启用布隆过滤器（仅在已有缓存文件时生效）
+    BLOOM_FILE = "processed_index.bloom"  # 布隆过滤器持久化文件（位于缓存目录）
+    BLOOM_FP_RATE = 0.01  # 布隆过滤器目标误判率
+
+    # 输入清单配置
+    ENABLE_INPUT_MANIFEST = True  # 是否跳过未变化的输入文件、只处理追加部分
+    INPUT_MANIFEST = "input_manifest.json"  # 输入文件清单（大小、首尾采样哈希、续读偏移、条目数）
+    HASH_CHUNK_SIZE = 1024 * 1024  # 计算输入文件指纹时每次读取的字节数
+    HASH_SAMPLE_SIZE = 64 * 1024  # 快速判断文件未变化时读取的首尾字节数
+
+    # 输入解析配置
+    STREAM_CHUNK_SIZE = 64 * 1024  # 流式解析每次读取的字符数
+    EXTRACT_BATCH_SIZE = 5000  # 每批提取并去重的推文数
+
+    # 自动模式配置
+    AUTO_WINDOW_DAYS = 8  # 自动模式处理的天数（包含今天），可由环境变量 XBOT_WINDOW_DAYS 覆盖
+    AUTO_WORKERS = 1  # 并行解析的工作进程数，1 为逐日串行处理，可由环境变量 XBOT_WORKERS 覆盖
+
+    # 性能统计配置
+    PROFILE_MODE = os.getenv("XBOT_PROFILE", "")  # 性能剖析：cprofile / tracemalloc，空为关闭（也可用 --profile 参数）
+    WRITE_METRICS = True  # 运行结束时输出阶段耗时表并写入 logs/metrics-YYYY-MM-DD.jsonl
 
     # 路径配置
     DEFAULT_INPUT_DIR = "../../TypeScript/tweets/"  # 默认输入目录
     DEFAULT_OUTPUT_DIR = "../output/"  # 默认输出目录
+    OUTPUT_MAX_SEGMENTS = 64  # 输出增量段达到该数量时合并回基础文件
+    OUTPUT_FORMATS = ("json",)  # 输出格式：json（兼容）/ ijsonl（紧凑记录）/ msgpack（需安装msgpack）
 
     # 日期格式
     DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"  # 时间戳格式
@@ -39,16 +87,37 @@ logger.info("🔄 X-Bot 初始化完成")
 # 分片管理器
 # --------------------
 class ShardManager:
-    """管理已处理条目的分片存储"""
+    """管理已处理条目的分片存储
+
+    当月活动分片为追加日志（每行一个条目ID），写满或跨月后压缩为
+    processed_entries_YYYY-MM-NNNN.json 格式的封存分片
+    """
 
     def __init__(self):
         self._ensure_shard_dir()
+        self._remove_legacy_caches()
+        self._base_signature = None  # 本次启动导入分片前的索引签名
+        self._unfiltered = []  # 导入索引后尚未加入布隆过滤器的条目ID
+        self.imported_count = 0  # 本次启动从分片导入索引的条目数
+        self._active = None  # 当前活动日志分片信息
+        self._handle = None  # 活动日志分片文件句柄
+        self._pending_sync = 0  # 未fsync的追加条数
 
     def _ensure_shard_dir(self):
         """确保分片目录存在"""
         if not os.path.exists(Config.SHARD_DIR):
             os.makedirs(Config.SHARD_DIR)
             logger.info(f"📁 创建分片目录: {Config.SHARD_DIR}")
+        os.makedirs(Config.CACHE_DIR, exist_ok=True)
+
+    @staticmethod
+    def _remove_legacy_caches():
+        """删除旧版本写在分片目录中的派生缓存，避免随数据仓库同步"""
+        for name in (Config.INDEX_FILE, Config.BLOOM_FILE):
+            path = os.path.join(Config.SHARD_DIR, name)
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"🧹 已删除分片目录中的旧缓存: {path}")
 
     def get_current_shard_info(self):
         """获取当前分片信息"""
@@ -69,12 +138,12 @@ class ShardManager:
                 max_num = max(max_num, num)
         return max_num
 
-    def _list_shard_files(self):
-        """列出所有分片文件"""
+    def _list_shard_files(self, suffixes=(Config.SHARD_JSON_SUFFIX, Config.SHARD_LOG_SUFFIX)):
+        """列出所有分片文件（封存分片与日志分片）"""
         return [
             os.path.join(Config.SHARD_DIR, f)
             for f in os.listdir(Config.SHARD_DIR)
-            if f.startswith(Config.SHARD_PREFIX) and f.endswith(".json")
+            if f.startswith(Config.SHARD_PREFIX) and f.endswith(suffixes)
         ]
 
     @staticmethod
@@ -83,183 +152,735 @@ class ShardManager:
         filename = os.path.basename(file_path)
         return int(filename.split("-")[-1].split(".")[0])
 
-    def save_entry_id(self, entry_id):
-        """保存条目ID到合适的分片"""
+    def save_entry_ids(self, entry_ids):
+        """批量追加条目ID，写满时切换分片，每个涉及的分片仅写入一次"""
+        entry_ids = list(entry_ids)
+        touched = []
+        year_month = datetime.now().strftime(Config.YEAR_MONTH)
+        if entry_ids and (self._active is None or self._active["year_month"] != year_month):
+            self._open_active_shard()
+
+        pos = 0
+        with perf.stage("shard_write", count=len(entry_ids)) as stage:
+            while pos < len(entry_ids):
+                room = Config.MAX_ENTRIES_PER_SHARD - self._active["count"]
+                chunk = entry_ids[pos:pos + room]
+                data = "".join(f"{entry_id}\n" for entry_id in chunk)
+                self._handle.write(data)
+                stage.bytes += len(data.encode("utf-8"))
+                self._active["count"] += len(chunk)
+                self._pending_sync += len(chunk)
+                touched.append(self._active["path"])
+                pos += len(chunk)
+
+                if self._active["count"] >= Config.MAX_ENTRIES_PER_SHARD:
+                    self._seal_active_shard()
+                    if pos < len(entry_ids):
+                        self._open_active_shard()
+                else:
+                    self.flush()
+
+        logger.debug(f"📥 批量写入条目: {len(entry_ids)} | 涉及分片: {len(touched)}")
+        return touched
+
+    @contextmanager
+    def transaction(self, entry_ids, output_path):
+        """条目ID与输出文件的提交事务
+
+        先落盘事务日志，块内保存输出文件，成功后再追加分片并清除日志。
+        进程中断后由 recover_transaction 根据输出文件决定前滚或回滚。
+        """
+        entry_ids = list(entry_ids)
+        if not entry_ids:
+            yield entry_ids
+            return
+
+        journal_path = self._journal_path()
+        self._write_atomic(journal_path, json_utils.dumps({
+            "output_path": output_path,
+            "entry_ids": entry_ids
+        }, pretty=json_utils.pretty_for("state")))
+        try:
+            yield entry_ids
+        except BaseException:
+            os.remove(journal_path)
+            logger.warning(f"↩️ 输出保存失败，已回滚 {len(entry_ids)} 条待提交条目")
+            raise
+
+        self.save_entry_ids(entry_ids)
+        os.remove(journal_path)
+
+    def recover_transaction(self, is_committed, processed):
+        """恢复上次中断的提交：输出已保存则补写分片，否则丢弃；返回是否补写"""
+        journal_path = self._journal_path()
+        if not os.path.exists(journal_path):
+            return False
+
+        try:
+            with open(journal_path, "r", encoding="utf-8") as f:
+                journal = json_utils.load(f)
+        except json_utils.JSONDecodeError:
+            logger.warning(f"⚠️ 事务日志损坏，已丢弃: {journal_path}")
+            os.remove(journal_path)
+            return False
+
+        output_path, entry_ids = journal["output_path"], journal["entry_ids"]
+        if is_committed(output_path, entry_ids):
+            missing = [e for e in entry_ids if e not in processed]
+            self.save_entry_ids(missing)
+            processed.update(missing)
+            self._unfiltered.extend(missing)
+            logger.warning(f"🔁 已前滚中断的提交: {output_path} (补写条目: {len(missing)})")
+        else:
+            logger.warning(f"↩️ 已回滚中断的提交: {output_path} (条目: {len(entry_ids)})")
+            missing = []
+        os.remove(journal_path)
+        return bool(missing)
+
+    @staticmethod
+    def _journal_path():
+        """事务日志路径"""
+        return os.path.join(Config.SHARD_DIR, Config.SHARD_JOURNAL)
+
+    def flush(self):
+        """将已追加的条目落盘"""
+        if self._handle and self._pending_sync:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+            self._pending_sync = 0
+
+    def close(self):
+        """落盘并关闭活动分片"""
+        if self._handle:
+            self.flush()
+            self._handle.close()
+        self._handle = None
+        self._active = None
+
+    def compact(self, exclude=None):
+        """将非活动日志分片压缩为JSON封存分片"""
+        if exclude is None and self._active:
+            exclude = self._active["path"]
+        for log_path in self._list_shard_files((Config.SHARD_LOG_SUFFIX,)):
+            if log_path != exclude:
+                self._seal_log(log_path)
+
+    def _open_active_shard(self):
+        """打开当月的活动日志分片"""
+        self.close()
         shard_info = self.get_current_shard_info()
-        candidate_path = self._build_shard_path(shard_info["year_month"], shard_info["current_max"])
+        year_month = shard_info["year_month"]
+        shard_number = max(shard_info["current_max"], 1)
+        log_path = self._build_shard_path(year_month, shard_number, Config.SHARD_LOG_SUFFIX)
+        json_path = self._build_shard_path(year_month, shard_number, Config.SHARD_JSON_SUFFIX)
+
+        # 周期性压缩：封存其余日志分片（上月遗留等）
+        self.compact(exclude=log_path)
+
+        count = 0
+        if os.path.exists(log_path):
+            count = self._recover_log(log_path)
+        elif os.path.exists(json_path):
+            # 一次性迁移：旧版未写满的JSON分片转为日志分片继续追加
+            if self._migrate_legacy_shard(json_path, log_path):
+                count = self._recover_log(log_path)
+            else:
+                shard_number = shard_info["next_shard"]
 
-        # 尝试写入现有分片
-        if os.path.exists(candidate_path):
-            try:
-                with open(candidate_path, "r+") as f:
-                    entries = json.load(f)
-                    if len(entries) < Config.MAX_ENTRIES_PER_SHARD:
-                        entries.append(entry_id)
-                        f.seek(0)
-                        json.dump(entries, f, indent=2 if Config.FORMAT_SHARDS else None)
-                        logger.debug(f"📥 条目 {entry_id} 已写入现有分片: {candidate_path}")
-                        return candidate_path
-            except json.JSONDecodeError:
-                logger.warning("🔄 检测到损坏分片，尝试修复...")
-                return self._handle_corrupted_shard(candidate_path, entry_id)
-
-        # 创建新分片
-        new_path = self._build_shard_path(shard_info["year_month"], shard_info["next_shard"])
-        self._write_shard(new_path, [entry_id])
-        logger.info(f"✨ 创建新分片: {new_path}")
-        return new_path
-
-    def _build_shard_path(self, year_month, shard_number):
+        if count >= Config.MAX_ENTRIES_PER_SHARD:
+            self._seal_log(log_path)
+            shard_number += 1
+            count = 0
+        log_path = self._build_shard_path(year_month, shard_number, Config.SHARD_LOG_SUFFIX)
+
+        self._handle = open(log_path, "a", encoding="utf-8")
+        self._active = {
+            "year_month": year_month,
+            "number": shard_number,
+            "path": log_path,
+            "count": count
+        }
+        logger.info(f"✨ 启用日志分片: {log_path} (已有条目: {count})")
+
+    def _seal_active_shard(self):
+        """封存已写满的活动分片"""
+        path = self._active["path"]
+        self.close()
+        self._seal_log(path)
+
+    def _migrate_legacy_shard(self, json_path, log_path):
+        """将未写满的旧版JSON分片迁移为日志分片，返回是否迁移"""
+        try:
+            with open(json_path, "rb") as f:
+                entries = json_utils.load(f)
+        except json_utils.JSONDecodeError:
+            logger.warning(f"⚠️ 旧版分片已损坏，保留原文件并启用新分片: {json_path}")
+            return False
+
+        if len(entries) >= Config.MAX_ENTRIES_PER_SHARD:
+            return False
+
+        self._write_atomic(log_path, "".join(f"{e}\n" for e in entries))
+        os.remove(json_path)
+        logger.info(f"🔄 旧版分片已迁移为日志分片: {json_path} -> {log_path}")
+        return True
+
+    @staticmethod
+    def _recover_log(path):
+        """截断崩溃遗留的不完整行，返回已有条目数"""
+        with open(path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                valid = data.rfind(b"\n") + 1
+                f.truncate(valid)
+                data = data[:valid]
+                logger.warning(f"🔄 已截断日志分片中不完整的记录: {path}")
+        return data.count(b"\n")
+
+    def _seal_log(self, log_path):
+        """将日志分片压缩为同编号的JSON封存分片"""
+        entries = self._read_log(log_path)
+        json_path = log_path[:-len(Config.SHARD_LOG_SUFFIX)] + Config.SHARD_JSON_SUFFIX
+        self._write_shard(json_path, entries)
+        os.remove(log_path)
+        logger.info(f"📦 日志分片已封存: {json_path} (条目数: {len(entries)})")
+
+    @staticmethod
+    def _read_log(path):
+        """读取日志分片中的条目ID"""
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f if line.endswith("\n") and line != "\n"]
+
+    def _build_shard_path(self, year_month, shard_number, suffix=Config.SHARD_JSON_SUFFIX):
         """构建分片文件路径"""
         return os.path.join(
             Config.SHARD_DIR,
-            f"{Config.SHARD_PREFIX}{year_month}-{shard_number:04d}.json"
+            f"{Config.SHARD_PREFIX}{year_month}-{shard_number:04d}{suffix}"
         )
 
-    def _handle_corrupted_shard(self, path, entry_id):
-        """处理损坏的分片文件"""
-        try:
-            self._write_shard(path, [entry_id])
-            logger.warning(f"✅ 成功修复损坏分片: {path}")
-            return path
-        except Exception as e:
-            logger.error(f"❌ 修复分片失败: {str(e)}")
-            raise
-
     def _write_shard(self, path, data):
         """写入分片文件"""
-        with open(path, "w") as f:
-            json.dump(data, f, indent=2 if Config.FORMAT_SHARDS else None)
+        self._write_atomic(path, json_utils.dumps(data, pretty=json_utils.pretty_for("shard")))
+
+    @staticmethod
+    def _write_atomic(path, content):
+        """先写临时文件再替换，避免写入中断损坏分片"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load_processed_index(self):
+        """打开持久化去重索引，并增量导入有变化的分片
+
+        索引缓存缺失时（如CI全新检出且未恢复缓存）直接将全部分片读入内存集合，
+        关闭时再写出索引供下次运行打开
+        """
+        path = os.path.join(Config.CACHE_DIR, Config.INDEX_FILE)
+        index = ProcessedIndex(path) if os.path.exists(path) else ProcessedSet(path)
+        recorded = index.get_shard_state()
+        self._base_signature = ProcessedIndex.state_signature(recorded)
+        state = {}
+        imported = []
 
-    def load_processed_entries(self):
-        """加载所有已处理条目"""
-        processed = set()
         for file_path in self._list_shard_files():
+            name = os.path.basename(file_path)
+            size = os.path.getsize(file_path)
+            offset = recorded.get(name)
+            if offset == size:
+                state[name] = size
+                continue
+
+            # 日志分片只读取上次记录位置之后的追加内容
+            if not file_path.endswith(Config.SHARD_LOG_SUFFIX) or offset is None or offset > size:
+                offset = 0
             try:
-                with open(file_path, "r") as f:
-                    entries = json.load(f)
-                    processed.update(entries)
-                    logger.debug(f"📖 加载分片: {file_path} (条目数: {len(entries)})")
+                entries, state[name] = self._read_shard(file_path, offset)
             except Exception as e:
                 logger.warning(f"⚠️ 跳过损坏分片 {file_path}: {str(e)}")
-        logger.info(f"🔍 已加载历史条目总数: {len(processed)}")
-        return processed
+                continue
+            imported.extend(entries)
+            logger.debug(f"📖 索引导入分片: {file_path} (条目数: {len(entries)})")
+
+        # 全部分片在一个事务内批量写入
+        index.update(imported, state)
+        self._unfiltered = imported
+        self.imported_count = len(imported)
+        if isinstance(index, ProcessedSet):
+            logger.info(f"🔍 去重索引缓存缺失，已从分片加载到内存: {len(index)} 条 | 分片数: {len(state)}")
+        else:
+            logger.info(f"🔍 去重索引已就绪，增量导入条目: {len(imported)} | 分片数: {len(state)}")
+        return index
+
+    def mark_indexed(self, index):
+        """记录分片当前大小，本次运行写入的条目已同步写入索引"""
+        index.set_shard_state({
+            os.path.basename(file_path): os.path.getsize(file_path)
+            for file_path in self._list_shard_files()
+        })
+
+    def load_bloom_filter(self, index):
+        """
+        加载布隆过滤器缓存并补入本次导入索引的条目
+        启动时不重建：内存集合无需过滤器，缓存文件缺失、过期或容量不足时本次运行不启用
+        """
+        pending, self._unfiltered = self._unfiltered, []
+        if isinstance(index, ProcessedSet):
+            return None
+        path = os.path.join(Config.CACHE_DIR, Config.BLOOM_FILE)
+        bloom = BloomFilter.load(path, self._base_signature, Config.BLOOM_FP_RATE)
+        if bloom is None or bloom.count + len(pending) >= bloom.capacity:
+            logger.info("🧮 无可用的布隆过滤器缓存，本次运行直接查询索引")
+            return None
+        bloom.update(pending)
+        logger.info(f"🧮 已加载布隆过滤器: {path} (条目数: {bloom.count} | 补入: {len(pending)})")
+        return bloom
+
+    def build_bloom_filter(self, entry_ids):
+        """由全部条目构建布隆过滤器（随索引缓存一同写出），容量为当前条目数加一个分片的余量"""
+        entry_ids = list(entry_ids)
+        capacity = max(len(self._list_shard_files()), len(entry_ids) // Config.MAX_ENTRIES_PER_SHARD)
+        bloom = BloomFilter((capacity + 1) * Config.MAX_ENTRIES_PER_SHARD, Config.BLOOM_FP_RATE)
+        bloom.update(entry_ids)
+        logger.info(f"🧮 已构建布隆过滤器: 条目数 {bloom.count} | 容量 {bloom.capacity} | "
+                    f"大小 {len(bloom.bits) // 1024}KB")
+        return bloom
+
+    def save_bloom_filter(self, bloom, index):
+        """持久化布隆过滤器，并记录对应的分片状态"""
+        bloom.save(os.path.join(Config.CACHE_DIR, Config.BLOOM_FILE), index.signature())
+
+    @staticmethod
+    def _read_shard(path, offset=0):
+        """读取分片条目，返回 (条目列表, 已读取到的字节位置)"""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        if not path.endswith(Config.SHARD_LOG_SUFFIX):
+            return json_utils.loads(data), offset + len(data)
+
+        # 只读取完整的行，不完整的尾部留待下次导入
+        complete = data[:data.rfind(b"\n") + 1]
+        entries = [line for line in complete.decode("utf-8").split("\n") if line]
+        return entries, offset + len(complete)
 
 
 # --------------------
-# 条目处理器
+# 去重索引
 # --------------------
-class EntryProcessor:
-    """处理推文条目中的媒体资源"""
+class ProcessedIndex:
+    """已处理条目ID的持久化索引（SQLite）
 
-    @staticmethod
-    def generate_entry_id(filename, username, media_type):
-        """生成唯一条目ID"""
-        return f"{filename}_{username}_{media_type}"
+    按条目ID主键查询，无需在内存中加载全部历史；
+    同时记录各分片已导入的位置，用于启动时增量同步
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self._conn = self._connect()
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"⚠️ 去重索引损坏，将从分片重建: {str(e)}")
+            os.remove(path)
+            self._conn = self._connect()
+
+    def _connect(self):
+        """连接数据库并初始化表结构"""
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS processed (
+                entry_id TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS shard_state (
+                shard TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL
+            );
+        """)
+        return conn
+
+    def __contains__(self, entry_id):
+        cursor = self._conn.execute("SELECT 1 FROM processed WHERE entry_id = ?", (entry_id,))
+        return cursor.fetchone() is not None
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+    def __iter__(self):
+        for (entry_id,) in self._conn.execute("SELECT entry_id FROM processed"):
+            yield entry_id
+
+    def contains_many(self, entry_ids, chunk_size=500):
+        """批量查询，返回已存在的条目ID集合"""
+        entry_ids = list(entry_ids)
+        found = set()
+        for start in range(0, len(entry_ids), chunk_size):
+            chunk = entry_ids[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(row[0] for row in self._conn.execute(
+                f"SELECT entry_id FROM processed WHERE entry_id IN ({placeholders})", chunk
+            ))
+        return found
+
+    def update(self, entry_ids, shard_state=None):
+        """批量写入条目ID，可在同一事务内覆盖分片导入位置
+
+        按主键顺序插入，B树只在末端追加页面，从分片全量重建时比乱序插入快得多
+        """
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO processed (entry_id) VALUES (?)",
+                ((entry_id,) for entry_id in sorted(set(entry_ids)))
+            )
+            if shard_state is not None:
+                self._write_shard_state(shard_state)
+
+    def get_shard_state(self):
+        """获取各分片已导入的字节位置"""
+        return dict(self._conn.execute("SELECT shard, offset FROM shard_state"))
+
+    def set_shard_state(self, state):
+        """覆盖记录各分片已导入的字节位置"""
+        with self._conn:
+            self._write_shard_state(state)
+
+    def _write_shard_state(self, state):
+        self._conn.execute("DELETE FROM shard_state")
+        self._conn.executemany("INSERT INTO shard_state (shard, offset) VALUES (?, ?)", state.items())
+
+    def signature(self):
+        """根据分片导入状态生成签名，用于判断派生数据是否过期"""
+        return self.state_signature(self.get_shard_state())
 
     @staticmethod
-    def create_entry_template(filename, user_info, media_type, url):
-        """创建标准条目模板"""
+    def state_signature(state):
+        return hashlib.sha1(json.dumps(sorted(state.items())).encode("utf-8")).hexdigest()
+
+    def close(self):
+        """关闭数据库连接"""
+        self._conn.close()
+
+
+class ProcessedSet:
+    """索引缓存缺失时使用的内存去重集合，接口同 ProcessedIndex
+
+    本次运行直接在内存中查询，关闭时将全部条目与分片状态写出为SQLite索引
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._ids = set()
+        self._state = {}
+
+    def __contains__(self, entry_id):
+        return entry_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def contains_many(self, entry_ids):
+        """批量查询，返回已存在的条目ID集合"""
+        return self._ids.intersection(entry_ids)
+
+    def update(self, entry_ids, shard_state=None):
+        """写入条目ID，可同时覆盖分片导入位置"""
+        self._ids.update(entry_ids)
+        if shard_state is not None:
+            self._state = dict(shard_state)
+
+    def get_shard_state(self):
+        return dict(self._state)
+
+    def set_shard_state(self, state):
+        self._state = dict(state)
+
+    def signature(self):
+        return ProcessedIndex.state_signature(self._state)
+
+    def close(self):
+        """写出SQLite索引，下次运行无需再读取全部分片"""
+        with perf.stage("index_persist", count=len(self._ids)):
+            index = ProcessedIndex(self.path)
+            index.update(self._ids, self._state)
+            index.close()
+        logger.info(f"💾 去重索引已写入缓存: {self.path} (条目数: {len(self._ids)})")
+
+
+class BloomFilter:
+    """条目ID的布隆过滤器
+
+    在精确查询前排除确定未处理的条目，按容量与误判率计算位数组大小
+    """
+
+    def __init__(self, capacity, fp_rate, bits=None, count=0):
+        self.capacity = max(int(capacity), 1)
+        self.fp_rate = fp_rate
+        self.num_bits = max(int(-self.capacity * math.log(fp_rate) / math.log(2) ** 2), 8)
+        self.num_hashes = max(round(self.num_bits / self.capacity * math.log(2)), 1)
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+        self.stats = {"queries": 0, "definite_misses": 0, "false_positives": 0}
+
+    def _positions(self, item):
+        """双重哈希生成各位下标"""
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        """添加单个条目"""
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, items):
+        """批量添加条目，与 add 设置相同的位，循环内联以加快全量构建"""
+        bits, num_bits, hashes = self.bits, self.num_bits, range(self.num_hashes)
+        blake2b, unpack = hashlib.blake2b, struct.Struct("<QQ").unpack
+        count = 0
+        for item in items:
+            h1, h2 = unpack(blake2b(item.encode("utf-8"), digest_size=16).digest())
+            pos, step = h1 % num_bits, (h2 | 1) % num_bits
+            for _ in hashes:
+                bits[pos >> 3] |= 1 << (pos & 7)
+                pos += step
+                if pos >= num_bits:
+                    pos -= num_bits
+            count += 1
+        self.count += count
+
+    def __contains__(self, item):
+        self.stats["queries"] += 1
+        for pos in self._positions(item):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                self.stats["definite_misses"] += 1
+                return False
+        return True
+
+    def record_false_positive(self, count=1):
+        """记录误判次数（过滤器命中但精确查询未命中）"""
+        self.stats["false_positives"] += count
+
+    def summary(self):
+        """统计摘要"""
+        queries = self.stats["queries"]
+        misses = self.stats["definite_misses"]
+        miss_ratio = misses / queries if queries else 0
+        return (f"查询 {queries} | 直接排除 {misses} ({miss_ratio:.1%}) | "
+                f"疑似命中 {queries - misses} | 误判 {self.stats['false_positives']}")
+
+    def save(self, path, signature):
+        """写入文件：首行为JSON元数据，其后为位数组"""
+        header = json_utils.dumpb({
+            "capacity": self.capacity,
+            "fp_rate": self.fp_rate,
+            "count": self.count,
+            "signature": signature
+        }, pretty=json_utils.pretty_for("state"))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header + b"\n")
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, signature, fp_rate):
+        """读取过滤器，签名不一致、参数变更或容量已满时返回None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                header = json_utils.loads(f.readline())
+                bits = bytearray(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 布隆过滤器文件损坏，将重建: {str(e)}")
+            return None
+
+        if header["signature"] != signature or header["fp_rate"] != fp_rate:
+            return None
+        bloom = cls(header["capacity"], header["fp_rate"], bits, header["count"])
+        if len(bits) != (bloom.num_bits + 7) // 8 or bloom.count >= bloom.capacity:
+            return None
+        return bloom
+
+
+# --------------------
+# 媒体条目
+# --------------------
+class MediaEntry:
+    """处理期间的紧凑媒体条目
+
+    user 为同一批次内共享的 (screen_name, name) 元组，
+    提交时才通过 to_dict 转换为输出文件的条目结构
+    """
+    __slots__ = ("entry_id", "file_name", "user", "media_type", "url",
+                 "tweet_id", "full_text", "publish_time", "read_time")
+
+    def __init__(self, entry_id, file_name, user, media_type, url,
+                 tweet_id="", full_text="", publish_time="", read_time=""):
+        self.entry_id = entry_id
+        self.file_name = file_name
+        self.user = user
+        self.media_type = media_type
+        self.url = url
+        self.tweet_id = tweet_id
+        self.full_text = full_text
+        self.publish_time = publish_time
+        self.read_time = read_time
+
+    def __reduce__(self):
+        # 按位置参数序列化，缩小并行提取结果的跨进程传输体积
+        return MediaEntry, tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_dict(self):
+        """转换为标准输出条目"""
         return {
-            "tweet_id": "",
-            "file_name": filename,
+            "tweet_id": self.tweet_id,
+            "file_name": self.file_name,
             "user": {
-                "screen_name": user_info["screen_name"],
-                "name": user_info.get("name", "N/A")
+                "screen_name": self.user[0],
+                "name": self.user[1]
             },
-            "media_type": media_type,
-            "url": url,
-            "read_time": datetime.now().strftime(Config.DATE_FORMAT),
+            "media_type": self.media_type,
+            "url": self.url,
+            "read_time": self.read_time,
             "is_uploaded": False,
             "upload_info": {},
             "is_downloaded": False,
             "download_info": {},
-            "full_text": "",
-            "publish_time": ""
+            "full_text": self.full_text,
+            "publish_time": self.publish_time
         }
 
-    def process_entry(self, entry, user_info, processed_ids):
-        """处理单个推文条目"""
-        new_entries = []
-
-        # 提取条目中的 tweet_id
-        tweet_id = self._extract_tweet_id(entry.get("tweet_url", ""))
-
-        # 处理普通媒体
-        new_entries.extend(self._process_media(entry, user_info, processed_ids, "images"))
-        new_entries.extend(self._process_media(entry, user_info, processed_ids, "videos"))
-
-        # 处理特殊链接
-        new_entries.extend(self._process_special_urls(entry, user_info, processed_ids))
 
-        # 补充元数据
-        for e in new_entries:
-            e.update({
-                "tweet_id": tweet_id,
-                "full_text": entry.get("full_text", ""),
-                "publish_time": entry.get("publish_time", "")
-            })
+# --------------------
+# 条目处理器
+# --------------------
+class EntryProcessor:
+    """处理推文条目中的媒体资源
 
-        return new_entries
+    按批次提取：先将一批推文的媒体链接展开为并列的候选列表，批量生成文件名与条目ID，
+    再以一次集合运算完成去重
+    """
 
-    def _process_media(self, entry, user_info, processed_ids, media_type):
-        """处理图片/视频类媒体"""
-        entries = []
-        for url in entry.get(media_type, []):
-            filename = self._extract_filename(url)
-            entry_id = self.generate_entry_id(filename, user_info["screen_name"], media_type)
+    TWEET_ID_PATTERN = re.compile(r"/status/([^/?]*)")
 
-            if entry_id in processed_ids:
-                continue
+    def __init__(self, prefilter=None):
+        self.prefilter = prefilter  # 可选的布隆过滤器，在精确查询前排除新条目
 
-            new_entry = self.create_entry_template(filename, user_info, media_type, url)
-            entries.append(new_entry)
-            logger.debug(f"📷 发现新{media_type}条目: {filename}")
+    def known_ids(self, entry_ids, processed_ids):
+        """批量判断已处理条目，返回候选ID中已处理的集合
 
-        return entries
+        过滤器确定未命中的ID跳过精确查询，其余ID一次性查询索引
+        """
+        candidates = set(entry_ids)
+        if self.prefilter is not None:
+            candidates = {entry_id for entry_id in candidates if entry_id in self.prefilter}
+        if not candidates:
+            return set()
 
-    def _process_special_urls(self, entry, user_info, processed_ids):
-        """处理广播/空间链接"""
-        entries = []
-        for url in entry.get("expand_urls", []):
-            media_type = self._detect_media_type(url)
-            if not media_type:
+        if hasattr(processed_ids, "contains_many"):
+            known = processed_ids.contains_many(candidates)
+        else:
+            known = {entry_id for entry_id in candidates if entry_id in processed_ids}
+        if self.prefilter is not None:
+            self.prefilter.record_false_positive(len(candidates) - len(known))
+        return known
+
+    def process_items(self, items, processed_ids, batch_size=None):
+        """流式处理原始推文，按用户首次出现顺序返回全部新条目
+
+        每 batch_size 条推文提取并去重一次，结果顺序与逐用户逐条处理一致；
+        同一用户的条目共享用户元组，读取时间每次调用只计算一次
+        """
+        batch_size = batch_size or Config.EXTRACT_BATCH_SIZE
+        read_time = datetime.now().strftime(Config.DATE_FORMAT)
+        users = {}  # 用户名 -> (用户元组, 新条目列表)
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self._process_batch(batch, users, processed_ids, read_time)
+                batch = []
+        if batch:
+            self._process_batch(batch, users, processed_ids, read_time)
+
+        return [e for _, new_entries in users.values() for e in new_entries]
+
+    def extract_batch(self, items, users, read_time):
+        """将一批原始推文展开为候选媒体条目（不去重）
+
+        返回并列的 (条目ID, 文件名, 媒体类型, 链接, (用户元组, 推文元数据)) 列表，
+        每条推文内依次为图片、视频、特殊链接
+        """
+        urls, media_types, contexts = [], [], []
+        for item in items:
+            user = item.get("user", {})
+            username = user.get("screenName")
+            if not username:
                 continue
 
-            filename = self._extract_filename(url)
-            entry_id = self.generate_entry_id(filename, user_info["screen_name"], media_type)
-
-            if entry_id in processed_ids:
-                continue
+            if username not in users:
+                users[username] = ((sys.intern(username), user.get("name", "N/A")), [])
+            # 推文级元数据：tweet_id、正文、发布时间、读取时间
+            context = (users[username][0], (
+                self._extract_tweet_id(item.get("tweetUrl", "")),
+                item.get("fullText", ""),
+                item.get("publishTime", ""),
+                read_time
+            ))
+
+            for media_type in ("images", "videos"):
+                media = item.get(media_type, [])
+                if media:
+                    urls.extend(media)
+                    media_types.extend([media_type] * len(media))
+                    contexts.extend([context] * len(media))
+
+            for url in item.get("expandUrls", []):
+                media_type = self._detect_media_type(url)
+                if media_type:
+                    urls.append(url)
+                    media_types.append(media_type)
+                    contexts.append(context)
+
+        # 批量生成文件名与条目ID
+        filenames = [url.partition("?")[0].rpartition("/")[2] for url in urls]
+        entry_ids = [
+            f"{filename}_{context[0][0]}_{media_type}"
+            for filename, context, media_type in zip(filenames, contexts, media_types)
+        ]
+        return entry_ids, filenames, media_types, urls, contexts
 
-            new_entry = self.create_entry_template(filename, user_info, media_type, url)
-            entries.append(new_entry)
-            logger.debug(f"🔗 发现特殊链接: {media_type} - {filename}")
+    def _process_batch(self, items, users, processed_ids, read_time):
+        """提取一批推文并以集合运算去重，新条目追加到所属用户"""
+        entry_ids, filenames, media_types, urls, contexts = self.extract_batch(items, users, read_time)
+        new_ids = set(entry_ids) - self.known_ids(entry_ids, processed_ids)
 
-        return entries
+        for entry_id, filename, media_type, url, (user_info, meta) in zip(
+                entry_ids, filenames, media_types, urls, contexts):
+            if entry_id in new_ids:
+                users[user_info[0]][1].append(MediaEntry(entry_id, filename, user_info, media_type, url, *meta))
+        logger.debug(f"📷 批量提取推文: {len(items)} | 候选条目: {len(entry_ids)} | 新条目: {len(new_ids)}")
 
-    @staticmethod
-    def _extract_tweet_id(tweet_url):
+    @classmethod
+    def _extract_tweet_id(cls, tweet_url):
         """从推文URL提取唯一ID"""
         if not tweet_url:
             return ""
 
-        # 查找/status/后的部分作为推文ID
-        parts = tweet_url.split("/status/")
-        if len(parts) > 1:
-            # 获取ID部分，并移除可能存在的查询参数
-            tweet_id = parts[1].split("?")[0].split("/")[0]
-            # 确保ID是纯数字
-            if tweet_id.isdigit():
-                return tweet_id
-
+        # 取/status/后到查询参数或下一级路径前的部分，且须为纯数字
+        match = cls.TWEET_ID_PATTERN.search(tweet_url)
+        if match and match.group(1).isdigit():
+            return match.group(1)
         return ""
 
-    @staticmethod
-    def _extract_filename(url):
-        """从URL提取文件名"""
-        return url.split("?")[0].split("/")[-1]
-
     @staticmethod
     def _detect_media_type(url):
         """识别链接类型"""
@@ -277,36 +898,221 @@ class FileManager:
     """处理文件IO操作"""
 
     @staticmethod
-    def load_json(path):
-        """安全加载JSON文件"""
+    def iter_json_items(path, chunk_size=None, offset=0, in_array=None):
+        """流式读取JSON数组或NDJSON文件，逐条产出元素，内存占用与文件大小无关
+
+        offset 为续读的字节偏移（上次处理到的最后一个元素之后），此时须通过
+        in_array 指明文件格式
+        """
+        chunk_size = chunk_size or Config.STREAM_CHUNK_SIZE
+        decoder = json.JSONDecoder()
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            logger.info(f"📂 成功加载文件: {path}")
-            return data
+            raw = open(path, "rb")
+            raw.seek(offset)
+            with io.TextIOWrapper(raw, encoding="utf-8") as f:
+                buf, pos, eof = "", 0, False
+                # in_array 为 None: 尚未识别格式；True: JSON数组；False: NDJSON
+                count = 0
+                while True:
+                    # 跳过空白与数组分隔符
+                    while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ",")):
+                        pos += 1
+                    if pos == len(buf) and not eof:
+                        chunk = f.read(chunk_size)
+                        buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                        continue
+                    if pos == len(buf):
+                        if in_array:
+                            raise json.JSONDecodeError("数组未闭合", buf, pos)
+                        break
+
+                    if in_array is None:
+                        in_array = buf[pos] == "["
+                        pos += in_array
+                        continue
+                    if not in_array:
+                        # NDJSON：补齐缓冲区中的当前行后逐行交给JSON后端解析
+                        for line in chain((buf[pos:] + f.readline()).split("\n"), f):
+                            if line.strip():
+                                yield json_utils.loads(line)
+                                count += 1
+                        break
+                    if buf[pos] == "]":
+                        break
+
+                    try:
+                        item, end = decoder.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                        item, end = None, len(buf)
+                    # 解析失败或值恰好止于缓冲区末尾时（可能被截断）读入更多数据重试
+                    if end == len(buf) and not eof:
+                        chunk = f.read(max(chunk_size, len(buf) - pos))
+                        buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                        continue
+
+                    yield item
+                    count += 1
+                    pos = end
+            resumed = f" (自偏移 {offset} 续读)" if offset else ""
+            logger.info(f"📂 成功流式读取文件: {path}{resumed} | 条目: {count}")
         except FileNotFoundError:
             logger.error(f"❌ 文件未找到: {path}")
             raise
-        except json.JSONDecodeError:
+        except json_utils.JSONDecodeError:
             logger.error(f"❌ JSON解析失败: {path}")
             raise
 
+
+# --------------------
+# 输入清单
+# --------------------
+class InputManifest:
+    """记录已处理输入文件的指纹，跳过未变化的文件、只处理追加的尾部
+
+    每个文件记录大小、首尾采样哈希，以及最后一个元素结束处的字节偏移与
+    该偏移之前内容的哈希；大小与首尾内容不变时视为未变化（不依赖修改时间，
+    CI 重新检出后依然命中），前缀哈希一致时视为追加写入，从该偏移续读
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.files = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    self.files = json_utils.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ 输入清单损坏，将重新处理全部输入: {path} | {e}")
+
+    def _key(self, data_path):
+        """以清单所在目录为基准的相对路径，整个仓库移动后仍然有效"""
+        return os.path.relpath(os.path.abspath(data_path), self.base_dir)
+
+    @staticmethod
+    def fingerprint(data_path, probe=None):
+        """
+        分块读取文件计算指纹，内存占用与文件大小无关
+        probe 为需要额外校验前缀哈希的偏移（上次记录的续读位置），哈希放在 probe_hash 字段
+        """
+        with open(data_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            is_array = InputManifest._first_byte(f) == b"["
+            end = InputManifest._content_end(f, size, is_array)
+            sample = sample_hash(f, size, Config.HASH_SAMPLE_SIZE)
+
+            # 一次顺序读取，在各标记位置记录当前累计哈希
+            f.seek(0)
+            digest = hashlib.sha1()
+            hashes = {}
+            pos = 0
+            for mark in sorted({m for m in (end, probe) if m is not None and m <= size}):
+                while pos < mark:
+                    chunk = f.read(min(Config.HASH_CHUNK_SIZE, mark - pos))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    pos += len(chunk)
+                hashes[mark] = digest.hexdigest()
+
+        return {
+            "size": size,
+            "sample_hash": sample,
+            "offset": end,
+            "prefix_hash": hashes[end],
+            "format": "array" if is_array else "ndjson",
+            "probe_hash": hashes.get(probe)
+        }
+
     @staticmethod
-    def save_output(data, output_path):
-        """保存输出文件"""
-        output_dir = os.path.dirname(output_path)
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            logger.info(f"📁 创建输出目录: {output_dir}")
+    def _first_byte(f):
+        """文件首个非空白字节"""
+        while chunk := f.read(4096):
+            stripped = chunk.lstrip()
+            if stripped:
+                return stripped[:1]
+        return b""
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        logger.info(f"💾 输出已保存至: {output_path}")
+    @staticmethod
+    def _content_end(f, size, is_array):
+        """续读偏移：JSON数组为闭合括号前最后一个非空白字节之后，NDJSON为末尾非空白字节之后"""
+        end = InputManifest._skip_trailing_space(f, size)
+        if is_array and end:
+            f.seek(end - 1)
+            if f.read(1) == b"]":
+                end = InputManifest._skip_trailing_space(f, end - 1)
+        return end
+
+    @staticmethod
+    def _skip_trailing_space(f, end, block=4096):
+        """从 end 向前跳过空白，返回其前最后一个非空白字节之后的位置"""
+        while end:
+            start = max(end - block, 0)
+            f.seek(start)
+            kept = len(f.read(end - start).rstrip(b" \t\r\n"))
+            if kept:
+                return start + kept
+            end = start
+        return 0
+
+    def plan(self, data_path):
+        """
+        检查输入文件变化
+        返回 None（未变化，跳过）或 (指纹, 续读偏移)，偏移为0表示完整处理
+        """
+        record = self.files.get(self._key(data_path))
+        if record and "sample_hash" in record and os.path.getsize(data_path) == record["size"]:
+            with open(data_path, "rb") as f:
+                if sample_hash(f, record["size"], Config.HASH_SAMPLE_SIZE) == record["sample_hash"]:
+                    return None
+
+        fingerprint = self.fingerprint(data_path, record["offset"] if record else None)
+        probe_hash = fingerprint.pop("probe_hash")
+        if not record:
+            return fingerprint, 0
+
+        # 前缀未变时从上次的偏移续读追加部分，否则完整处理
+        offset = record["offset"]
+        if offset and fingerprint["format"] == record["format"] and probe_hash == record["prefix_hash"]:
+            return fingerprint, offset
+        return fingerprint, 0
+
+    def record(self, data_path, fingerprint, offset, new_count):
+        """处理提交后记录文件指纹，续读时累加新增条目数"""
+        key = self._key(data_path)
+        previous = self.files.get(key, {}).get("entries", 0) if offset else 0
+        self.files[key] = {**fingerprint, "entries": previous + new_count}
+        self._dirty = True
+
+    def save(self):
+        """有变化时写入清单"""
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json_utils.dumpb({"version": 1, "files": self.files}, pretty=json_utils.pretty_for("state")))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
 
 
 # --------------------
 # 核心流程
 # --------------------
+@dataclass
+class ProcessResult:
+    """单个数据文件的处理结果"""
+    data_path: str
+    output_path: str
+    new_entries: list = field(default_factory=list)
+
+    @property
+    def new_count(self):
+        return len(self.new_entries)
+
+
 class XBotCore:
     """主处理逻辑"""
 
@@ -314,103 +1120,241 @@ class XBotCore:
         self.shard_manager = ShardManager()
         self.entry_processor = EntryProcessor()
         self.file_manager = FileManager()
-        self.processed_ids = self.shard_manager.load_processed_entries()
+        self._stores = {}  # 输出路径 -> OutputStore，关闭时统一压缩
+        with perf.stage("index_load") as stage:
+            self.processed_ids = self.shard_manager.load_processed_index()
+            stage.count = self.shard_manager.imported_count
+        with perf.stage("recovery"):
+            if self.shard_manager.recover_transaction(self._is_output_committed, self.processed_ids):
+                self.shard_manager.mark_indexed(self.processed_ids)
+        if Config.ENABLE_BLOOM_FILTER:
+            with perf.stage("bloom_load"):
+                self.entry_processor.prefilter = self.shard_manager.load_bloom_filter(self.processed_ids)
+        self.manifest = None
+        if Config.ENABLE_INPUT_MANIFEST:
+            self.manifest = InputManifest(os.path.join(Config.SHARD_DIR, Config.INPUT_MANIFEST))
 
     def process_single_day(self, data_path, output_path):
         """处理单日数据"""
         logger.info(f"\n{'-' * 40}\n🔍 开始处理: {os.path.basename(data_path)}")
+        plan = self.plan_input(data_path)
+        if plan is None:
+            logger.info(f"⏭️ 输入文件未变化，跳过: {os.path.basename(data_path)}\n{'-' * 40}\n")
+            return ProcessResult(data_path, output_path)
+        fingerprint, offset, in_array = plan
+
+        # 流式加载并处理条目（解析耗时单独计入 json_parse）
+        with perf.stage("extract") as stage:
+            size = os.path.getsize(data_path) - offset if os.path.exists(data_path) else 0
+            items = perf.timed_iter(
+                "json_parse", self.file_manager.iter_json_items(data_path, offset=offset, in_array=in_array), size
+            )
+            all_new_entries = self.entry_processor.process_items(items, self.processed_ids)
+            stage.count = len(all_new_entries)
+        result = self.commit_entries(data_path, output_path, all_new_entries)
+        self.record_input(data_path, fingerprint, offset, result.new_count)
+        return result
+
+    def plan_input(self, data_path):
+        """
+        对照输入清单检查数据文件
+        返回 None（未变化）或 (指纹, 续读偏移, 是否JSON数组)，未启用清单时完整处理
+        """
+        if self.manifest is None or not os.path.exists(data_path):
+            return None, 0, None
+        with perf.stage("manifest"):
+            plan = self.manifest.plan(data_path)
+        if plan is None:
+            return None
+        fingerprint, offset = plan
+        return fingerprint, offset, (fingerprint["format"] == "array") if offset else None
+
+    def record_input(self, data_path, fingerprint, offset, new_count):
+        """提交成功后更新输入清单"""
+        if self.manifest is not None and fingerprint is not None:
+            self.manifest.record(data_path, fingerprint, offset, new_count)
+
+    def commit_entries(self, data_path, output_path, all_new_entries, dedup=False):
+        """单一写入者：去重后合并输出，并与新条目ID在同一事务中提交
+
+        all_new_entries 为 MediaEntry 列表，返回结果中为转换后的输出条目；
+        dedup 为 True 时对未经去重的候选条目（并行提取结果）重新过滤
+        """
+        if dedup:
+            with perf.stage("dedup", count=len(all_new_entries)):
+                known = self.entry_processor.known_ids((e.entry_id for e in all_new_entries), self.processed_ids)
+                all_new_entries = [e for e in all_new_entries if e.entry_id not in known]
+
+        # 转换为输出条目后追加输出增量段，并与新条目ID在同一事务中提交
+        new_ids = list(dict.fromkeys(e.entry_id for e in all_new_entries))
+        all_new_entries = [e.to_dict() for e in all_new_entries]
+        store = self._get_store(output_path)
+        with perf.stage("commit", count=len(all_new_entries)):
+            with self.shard_manager.transaction(new_ids, output_path):
+                store.append(all_new_entries)
+        self.processed_ids.update(new_ids)
+        if self.entry_processor.prefilter is not None:
+            self.entry_processor.prefilter.update(new_ids)
+        logger.info(f"🎉 本日处理完成！新增条目: {len(all_new_entries)}\n{'-' * 40}\n")
+        return ProcessResult(data_path, output_path, all_new_entries)
 
-        # 加载数据
-        raw_data = self.file_manager.load_json(data_path)
-        user_data = self._organize_user_data(raw_data)
-
-        # 处理条目
-        all_new_entries = []
-        # 遍历所有用户
-        for username in user_data:
-
-            user_info = user_data[username]
-
-            user_entries = []
-            for entry in user_info["entries"]:
-                user_entries.extend(self.entry_processor.process_entry(entry, user_info, self.processed_ids))
-
-            # 保存新条目ID
-            for entry in user_entries:
-                entry_id = EntryProcessor.generate_entry_id(
-                    entry["file_name"],
-                    entry["user"]["screen_name"],
-                    entry["media_type"]
-                )
-                self.shard_manager.save_entry_id(entry_id)
-
-            all_new_entries.extend(user_entries)
+    def process_user_file(self, data_path):
+        """处理单个用户数据文件，输出到当天文件"""
+        output_path = self.today_output_path()
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        return self.process_single_day(data_path, output_path)
 
-        # 合并输出
-        final_output = self._merge_output(output_path, all_new_entries)
-        self.file_manager.save_output(final_output, output_path)
-        logger.info(f"🎉 本日处理完成！新增条目: {len(all_new_entries)}\n{'-' * 40}\n")
-        return len(all_new_entries)
+    @staticmethod
+    def today_output_path():
+        """当天输出文件路径"""
+        current_date = datetime.now()
+        output_dir = os.path.normpath(
+            f"{Config.DEFAULT_OUTPUT_DIR}{current_date.strftime(Config.YEAR_MONTH)}/"
+        )
+        return os.path.join(output_dir, f"{current_date.strftime(Config.YEAR_MONTH_DAY)}.json")
 
-    def _organize_user_data(self, raw_data):
-        """重组用户数据结构"""
-        organized = {}
-        for item in raw_data:
-            user = item.get("user", {})
-            username = user.get("screenName")
-            if not username:
+    def _get_store(self, output_path):
+        """获取输出文件对应的增量存储"""
+        if output_path not in self._stores:
+            self._stores[output_path] = OutputStore(
+                output_path, Config.OUTPUT_MAX_SEGMENTS, Config.OUTPUT_FORMATS
+            )
+        return self._stores[output_path]
+
+    def _is_output_committed(self, output_path, entry_ids):
+        """检查输出文件是否已包含全部条目"""
+        store = self._get_store(output_path)
+        if not store.exists():
+            return False
+        saved_ids = store.entry_ids()
+        return all(entry_id in saved_ids for entry_id in entry_ids)
+
+    def close(self):
+        """释放资源并落盘分片，合并本次运行写入的输出增量段"""
+        with perf.stage("close"):
+            for store in self._stores.values():
+                store.compact()
+            self.shard_manager.close()
+            self.shard_manager.mark_indexed(self.processed_ids)
+            if self.manifest is not None:
+                self.manifest.save()
+            prefilter = self.entry_processor.prefilter
+            if prefilter is not None:
+                logger.info(f"🧮 布隆过滤器统计: {prefilter.summary()}")
+            elif Config.ENABLE_BLOOM_FILTER and isinstance(self.processed_ids, ProcessedSet):
+                # 冷启动写出索引缓存时一并构建，条目已在内存中，无需遍历索引
+                with perf.stage("bloom_build"):
+                    prefilter = self.shard_manager.build_bloom_filter(self.processed_ids)
+            if prefilter is not None:
+                self.shard_manager.save_bloom_filter(prefilter, self.processed_ids)
+            self.processed_ids.close()
+
+
+def extract_candidates(data_path, offset=0, in_array=None):
+    """解析数据文件（或自 offset 起的追加部分）并提取全部媒体条目（不去重），供并行工作线程/进程调用"""
+    items = FileManager.iter_json_items(data_path, offset=offset, in_array=in_array)
+    return EntryProcessor().process_items(items, ())
+
+
+def window_days(days):
+    """自动模式的日期窗口：从最早一天到今天，产出 (日期, 数据文件, 输出文件)"""
+    current_date = datetime.now()
+    for day_offset in reversed(range(days)):  # 包含今天
+        target_date = current_date - timedelta(days=day_offset)
+        year_month = target_date.strftime(Config.YEAR_MONTH)
+        data_filename = f"{target_date.strftime(Config.YEAR_MONTH_DAY)}.json"
+
+        # 输入与输出文件路径（按数据日期）
+        data_path = os.path.join(os.path.normpath(f"{Config.DEFAULT_INPUT_DIR}{year_month}/"), data_filename)
+        output_path = os.path.join(os.path.normpath(f"{Config.DEFAULT_OUTPUT_DIR}{year_month}/"), data_filename)
+        yield target_date.strftime(Config.YEAR_MONTH_DAY), data_path, output_path
+
+
+def run_window(core, days):
+    """逐日串行处理日期窗口"""
+    for day, data_path, output_path in window_days(days):
+        if os.path.exists(data_path):
+            logger.info(f"🔍 正在处理 {day} 数据...")
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            core.process_single_day(data_path, output_path)
+        else:
+            logger.info(f"⏭️ 跳过不存在的数据文件：{os.path.basename(data_path)}")
+
+
+def create_executor(workers):
+    """创建解析工作池：进程池依赖fork继承已加载的模块，不支持时退回线程池"""
+    if "fork" in multiprocessing.get_all_start_methods():
+        logger.info(f"⚙️ 启用进程池并行解析，工作数: {workers}")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    logger.warning("⚠️ 当前平台不支持fork，退回线程池")
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def submit_window(pool, core, days, workers):
+    """
+    按日期顺序提交解析任务，并按同样顺序产出 (日期, 数据文件, 输出文件, 清单检查结果, future)
+    未变化的文件不提交；同时在途的任务数不超过工作数的两倍，避免积压长窗口时候选条目占用过多内存
+    """
+    window = deque()
+    for day, data_path, output_path in window_days(days):
+        plan, future = None, None
+        if os.path.exists(data_path):
+            plan = core.plan_input(data_path)
+            if plan is not None:
+                _, offset, in_array = plan
+                future = pool.submit(extract_candidates, data_path, offset, in_array)
+        window.append((day, data_path, output_path, plan, future))
+
+        if len(window) > workers * 2:
+            yield window.popleft()
+
+    while window:
+        yield window.popleft()
+
+
+def run_window_parallel(core, days, workers):
+    """并行解析日期窗口内的数据文件，主进程作为唯一写入者按日期顺序去重并提交"""
+    with create_executor(workers) as pool:
+        for day, data_path, output_path, plan, future in submit_window(pool, core, days, workers):
+            if future is None:
+                reason = "未变化的输入文件" if os.path.exists(data_path) else "不存在的数据文件"
+                logger.info(f"⏭️ 跳过{reason}：{os.path.basename(data_path)}")
                 continue
 
-            if username not in organized:
-                organized[username] = {
-                    "screen_name": username,
-                    "name": user.get("name", "N/A"),
-                    "entries": []
-                }
-
-            organized[username]["entries"].append({
-                "tweet_url": item.get("tweetUrl", ""),
-                "full_text": item.get("fullText", ""),
-                "publish_time": item.get("publishTime", ""),
-                "images": item.get("images", []),
-                "videos": item.get("videos", []),
-                "expand_urls": item.get("expandUrls", [])
-            })
-        return organized
-
-    def _merge_output(self, output_path, new_entries):
-        """合并新旧输出文件"""
-        existing = []
-        if os.path.exists(output_path):
-            existing = self.file_manager.load_json(output_path)
-            logger.info(f"🔄 合并现有输出文件，已有条目: {len(existing)}")
-
-        existing_ids = {self._get_entry_id(e) for e in existing}
-        merged = existing.copy()
-        added = 0
-
-        for entry in new_entries:
-            entry_id = self._get_entry_id(entry)
-            if entry_id not in existing_ids:
-                merged.append(entry)
-                added += 1
-
-        merged.sort(key=lambda x: x.get("publish_time", ""))
-        logger.info(f"🆕 新增条目: {added} | 合并后总数: {len(merged)}")
-        return merged
-
-    @staticmethod
-    def _get_entry_id(entry):
-        """获取条目唯一标识"""
-        return f"{entry['file_name']}_{entry['user']['screen_name']}_{entry['media_type']}"
+            logger.info(f"🔍 正在提交 {day} 数据...")
+            with perf.stage("extract") as stage:
+                candidates = future.result()
+                stage.count = len(candidates)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            result = core.commit_entries(data_path, output_path, candidates, dedup=True)
+            fingerprint, offset, _ = plan
+            core.record_input(data_path, fingerprint, offset, result.new_count)
 
 
 # --------------------
 # 命令行接口
 # --------------------
 def main():
+    # --profile[=cprofile|tracemalloc] 开启性能剖析，其余参数交给 run 分派
+    args, profile_mode = [], Config.PROFILE_MODE
+    for arg in sys.argv[1:]:
+        if arg == "--profile" or arg.startswith("--profile="):
+            profile_mode = arg.partition("=")[2] or "cprofile"
+        else:
+            args.append(arg)
+
+    perf.start_profiling(profile_mode)
     core = XBotCore()
-    args = sys.argv[1:]  # 获取命令行参数
+    try:
+        run(core, args)
+    finally:
+        core.close()
+        if Config.WRITE_METRICS:
+            perf.finish("X-Bot", {"args": args})
+
+
+def run(core, args):
+    """按命令行参数分派处理模式"""
 
     # 指定输出目录：python X-Bot.py 数据文件 输出文件
     if len(args) == 2:
@@ -426,52 +1370,25 @@ def main():
     # 单参数模式：python X-Bot.py 数据文件
     elif len(args) == 1:
         data_path = os.path.normpath(args[0])
-        current_date = datetime.now()
-
-        # 生成当天输出路径
-        output_dir = os.path.normpath(
-            f"{Config.DEFAULT_OUTPUT_DIR}{current_date.strftime(Config.YEAR_MONTH)}/"
-        )
-        output_filename = f"{current_date.strftime(Config.YEAR_MONTH_DAY)}.json"
-        output_path = os.path.join(output_dir, output_filename)
 
         if os.path.exists(data_path):
             logger.info(f"⚡ 单文件模式处理：{os.path.basename(data_path)}")
-            os.makedirs(output_dir, exist_ok=True)
-            new_entries_count = core.process_single_day(data_path, output_path)
+            result = core.process_user_file(data_path)
             # 返回新增条数
-            print(new_entries_count)
+            print(result.new_count)
         else:
             logger.info(f"⏭️ 跳过不存在的数据文件：{data_path}")
             print(0)
 
     # 无参数模式：python X-Bot.py
     elif len(args) == 0:
-        current_date = datetime.now()
-
-        logger.info("🤖 自动模式：处理最近一周数据")
-        for day_offset in reversed(range(8)):  # 包含今天共8天
-            target_date = current_date - timedelta(days=day_offset)
-
-            # 输入文件路径（按数据日期）
-            data_dir = os.path.normpath(
-                f"{Config.DEFAULT_INPUT_DIR}{target_date.strftime(Config.YEAR_MONTH)}/"
-            )
-            data_filename = f"{target_date.strftime(Config.YEAR_MONTH_DAY)}.json"
-            data_path = os.path.join(data_dir, data_filename)
-
-            # 输出文件路径（按数据日期）
-            output_dir = os.path.normpath(
-                f"{Config.DEFAULT_OUTPUT_DIR}{target_date.strftime(Config.YEAR_MONTH)}/"
-            )
-            output_path = os.path.join(output_dir, data_filename)
-
-            if os.path.exists(data_path):
-                logger.info(f"🔍 正在处理 {target_date.strftime(Config.YEAR_MONTH_DAY)} 数据...")
-                os.makedirs(output_dir, exist_ok=True)
-                core.process_single_day(data_path, output_path)
-            else:
-                logger.info(f"⏭️ 跳过不存在的数据文件：{data_filename}")
+        days = env_number("XBOT_WINDOW_DAYS", Config.AUTO_WINDOW_DAYS, minimum=1)
+        workers = env_number("XBOT_WORKERS", Config.AUTO_WORKERS, minimum=1)
+        logger.info(f"🤖 自动模式：处理最近 {days} 天数据（工作数: {workers}）")
+        if workers > 1:
+            run_window_parallel(core, days, workers)
+        else:
+            run_window(core, days)
 
     # 错误参数处理
     else:
@@ -0,0 +1,28 @@
+import sys
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+
+
+def load_script(module_name, file_name):
+    """按路径加载 src 下的脚本（文件名含连字符，无法直接 import）"""
+    spec = importlib.util.spec_from_file_location(module_name, _project_root / "src" / file_name)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def tbot():
+    return load_script("t_bot", "T-Bot.py")
+
+
+@pytest.fixture(scope="session")
+def xbot():
+    return load_script("x_bot", "X-Bot.py")
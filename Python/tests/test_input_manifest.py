@@ -0,0 +1,93 @@
+import json
+import os
+
+import pytest
+
+
+def write_items(path, items, fmt):
+    """按输入格式写出推文条目：JSON数组或NDJSON"""
+    if fmt == "array":
+        text = json.dumps(items, indent=2)
+    else:
+        text = "".join(json.dumps(item) + "\n" for item in items)
+    path.write_text(text, encoding="utf-8")
+
+
+def resume(xbot, path, offset, fmt):
+    """按清单给出的偏移续读文件"""
+    in_array = (fmt == "array") if offset else None
+    return list(xbot.FileManager.iter_json_items(str(path), chunk_size=16, offset=offset, in_array=in_array))
+
+
+@pytest.fixture
+def manifest(xbot, tmp_path, monkeypatch):
+    # 采样小于文件大小，覆盖只读取首尾内容的快速比对
+    monkeypatch.setattr(xbot.Config, "HASH_SAMPLE_SIZE", 32)
+    return xbot.InputManifest(str(tmp_path / "input_manifest.json"))
+
+
+def items(*ids):
+    return [{"id": tweet_id, "text": f"tweet {tweet_id}"} for tweet_id in ids]
+
+
+def processed(manifest, path):
+    """首次完整处理并记录指纹"""
+    fingerprint, offset = manifest.plan(str(path))
+    assert offset == 0
+    manifest.record(str(path), fingerprint, offset, 2)
+    manifest.save()
+
+
+@pytest.mark.parametrize("fmt", ["array", "ndjson"])
+def test_unchanged_file_is_skipped_after_touch(xbot, manifest, tmp_path, fmt):
+    path = tmp_path / "tweets.json"
+    write_items(path, items("1", "2"), fmt)
+    processed(manifest, path)
+
+    # CI 检出会重置修改时间，内容不变时仍应跳过
+    os.utime(path, ns=(1, 1))
+    reloaded = xbot.InputManifest(manifest.path)
+    assert reloaded.plan(str(path)) is None
+    assert not reloaded._dirty
+
+
+@pytest.mark.parametrize("fmt", ["array", "ndjson"])
+def test_appended_items_resume_from_tail(xbot, manifest, tmp_path, fmt):
+    path = tmp_path / "tweets.json"
+    write_items(path, items("1", "2"), fmt)
+    processed(manifest, path)
+
+    write_items(path, items("1", "2", "3", "4"), fmt)
+    fingerprint, offset = manifest.plan(str(path))
+    assert offset > 0
+    assert [item["id"] for item in resume(xbot, path, offset, fmt)] == ["3", "4"]
+
+    manifest.record(str(path), fingerprint, offset, 2)
+    assert manifest.files[manifest._key(str(path))]["entries"] == 4
+    assert manifest.plan(str(path)) is None
+
+
+@pytest.mark.parametrize("fmt", ["array", "ndjson"])
+def test_truncated_file_is_reprocessed(xbot, manifest, tmp_path, fmt):
+    path = tmp_path / "tweets.json"
+    write_items(path, items("1", "2"), fmt)
+    processed(manifest, path)
+
+    write_items(path, items("1"), fmt)
+    fingerprint, offset = manifest.plan(str(path))
+    assert offset == 0
+    assert fingerprint["size"] == path.stat().st_size
+
+
+@pytest.mark.parametrize("fmt", ["array", "ndjson"])
+def test_same_size_rewrite_is_reprocessed(xbot, manifest, tmp_path, fmt):
+    path = tmp_path / "tweets.json"
+    write_items(path, items("1", "2"), fmt)
+    processed(manifest, path)
+    size = path.stat().st_size
+
+    write_items(path, items("1", "9"), fmt)
+    assert path.stat().st_size == size
+    fingerprint, offset = manifest.plan(str(path))
+    assert offset == 0
+    assert [item["id"] for item in resume(xbot, path, offset, fmt)] == ["1", "9"]
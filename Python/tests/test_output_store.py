@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+from utils.output_store import OutputStore
+from utils.subscriptions import SubscriptionRouter
+
+
+def raw_tweet(screen_name, tweet_id):
+    """TypeScript 抓取脚本输出的原始推文结构"""
+    return {
+        "user": {"screenName": screen_name, "name": screen_name.title()},
+        "fullText": f"tweet {tweet_id}",
+        "tweetUrl": f"https://x.com/{screen_name}/status/{tweet_id}",
+    }
+
+
+def output_entry(screen_name, file_name, publish_time):
+    """X-Bot 输出条目结构"""
+    return {
+        "tweet_id": file_name.split("-")[1],
+        "file_name": file_name,
+        "user": {"screen_name": screen_name, "name": screen_name.title()},
+        "media_type": "images",
+        "publish_time": publish_time,
+    }
+
+
+def test_load_users_matches_raw_schema(tmp_path):
+    path = tmp_path / "raw.json"
+    tweets = [raw_tweet("alice", 1), raw_tweet("bob", 2), raw_tweet("Alice", 3)]
+    path.write_text(json.dumps(tweets), encoding="utf-8")
+
+    assert OutputStore(str(path)).load_users({"ALICE"}) == [tweets[0], tweets[2]]
+
+
+def test_tbot_load_items_keeps_raw_schema_tweets(tmp_path, monkeypatch, tbot):
+    path = tmp_path / "raw.json"
+    tweets = [raw_tweet("alice", i) for i in range(3)] + [raw_tweet("carol", 9)]
+    path.write_text(json.dumps(tweets), encoding="utf-8")
+    router = SubscriptionRouter.from_config({"subscriptions": [
+        {"screen_names": ["alice"], "channels": ["telegram"]}
+    ]})
+    monkeypatch.setattr(tbot, "_router", router)
+
+    assert tbot.load_items(str(path)) == tweets[:3]
+
+
+def test_load_users_by_index_matches_filtered_load(tmp_path):
+    store = OutputStore(str(tmp_path / "2025-01-01.json"))
+    entries = [
+        output_entry(name, f"{name}-{i}-img.jpg", f"2025-01-01T00:00:{i:02d}")
+        for i, name in enumerate(["alice", "bob", "alice", "carol"])
+    ]
+    store._write_base(entries)
+    store.append([output_entry("bob", "bob-7-img.jpg", "2025-01-01T00:00:07")])
+
+    expected = [e for e in store.load() if e["user"]["screen_name"] in ("alice", "bob")]
+    assert store.load_users({"Alice", "bob"}) == expected
+
+
+def test_user_index_survives_checkout_and_detects_rewrite(tmp_path, monkeypatch):
+    path = tmp_path / "2025-01-01.json"
+    store = OutputStore(str(path))
+    entries = [
+        output_entry(name, f"{name}-{i}-img.jpg", f"2025-01-01T00:00:{i:02d}")
+        for i, name in enumerate(["alice", "bobby", "alice"])
+    ]
+    store._write_base(entries)
+
+    # CI 检出会重置修改时间，用户索引仍应命中，无需完整读取
+    os.utime(path, ns=(1, 1))
+    with monkeypatch.context() as m:
+        m.setattr(store, "load", lambda: pytest.fail("用户索引未命中"))
+        assert store.load_users({"alice"}) == [entries[0], entries[2]]
+
+    # 等长改写使索引失效，回退到完整读取
+    path.write_bytes(path.read_bytes().replace(b"bobby", b"alice"))
+    assert [e["file_name"] for e in store.load_users({"alice"})] == [f"alice-{i}-img.jpg" for i in range(3)]
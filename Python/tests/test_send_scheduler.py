@@ -0,0 +1,46 @@
+from utils.send_scheduler import SendScheduler, PermanentError
+
+
+def make_scheduler(tmp_path, sender, **kwargs):
+    scheduler = SendScheduler(queue_path=str(tmp_path / "retry_queue.jsonl"),
+                              max_attempts=2, base_delay=0, max_delay=0, **kwargs)
+    scheduler.register_channel("lark", sender, 1000, 1000, 1000, 1000)
+    return scheduler
+
+
+def test_permanent_error_is_dropped_without_retry(tmp_path):
+    calls = []
+
+    def sender(chat, payload):
+        calls.append(payload)
+        raise PermanentError("bad request")
+
+    scheduler = make_scheduler(tmp_path, sender)
+    assert scheduler.send("lark", "chat", "hello") is False
+    assert calls == ["hello"]
+    assert len(scheduler.queue) == 0
+    assert scheduler.metrics()["dropped"] == 1
+
+
+def test_queued_item_is_discarded_after_max_replays(tmp_path):
+    calls = []
+
+    def sender(chat, payload):
+        calls.append(payload)
+        raise ConnectionError("network down")
+
+    scheduler = make_scheduler(tmp_path, sender, max_replays=2)
+    assert scheduler.send("lark", "chat", "hello") is False
+    first_failed_at = scheduler.queue.drain()[0]["first_failed_at"]
+    scheduler.send("lark", "chat", "hello")
+
+    for replays in (1, 2):
+        scheduler.replay()
+        item = scheduler.queue.drain()[0]
+        assert item["replays"] == replays
+        assert item["first_failed_at"] == first_failed_at
+        scheduler.queue.push(item)
+
+    scheduler.replay()
+    assert len(scheduler.queue) == 0
+    assert len(calls) == 2 * 4
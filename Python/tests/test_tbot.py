@@ -0,0 +1,102 @@
+from concurrent.futures import Future
+
+import pytest
+from telegram import error as telegram_error
+
+
+def done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class FakeBot:
+    """记录发送内容，拒绝包含 bad 的消息（模拟 Telegram 的 BadRequest）"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        if "bad" in text:
+            raise telegram_error.BadRequest("Can't parse entities")
+        self.sent.append(text)
+
+
+@pytest.fixture
+def fake_bot(monkeypatch, tbot):
+    bot = FakeBot()
+    monkeypatch.setenv("BOT_TOKEN", "token")
+    monkeypatch.setitem(tbot.CHANNEL_LIMITS, "telegram", (1000, 1000, 1000, 1000))
+    monkeypatch.setattr(tbot.Notifier, "_scheduler", None)
+    monkeypatch.setattr(tbot.Notifier, "_lanes", {})
+    monkeypatch.setattr(tbot.Notifier, "_get_bot", classmethod(lambda cls, token: bot))
+    monkeypatch.setattr(tbot.Config, "COALESCE_MESSAGES", True)
+    return bot
+
+
+def test_telegram_text_is_html_escaped(fake_bot, tbot):
+    assert tbot.Notifier.send_telegram("a < b && c > d")
+    assert fake_bot.sent == ["a &lt; b &amp;&amp; c &gt; d"]
+
+
+def test_rejected_pack_is_resent_one_by_one(fake_bot, tbot):
+    batch = [("first", ["telegram"]), ("bad tweet", ["telegram"]), ("third", ["telegram"])]
+
+    results = list(tbot.Notifier.send_many(batch))
+
+    assert results == [{"telegram": True}, {"telegram": False}, {"telegram": True}]
+    assert fake_bot.sent == ["first", "third"]
+
+
+def test_split_message_delivered_only_if_all_parts_sent(monkeypatch, tbot):
+    outcomes = iter([False, True, True])  # 超长消息第1段失败、第2段成功，随后的短消息成功
+    sent = []
+
+    def fake_submit(message, destinations):
+        sent.append(message)
+        return {d: done(next(outcomes)) for d in destinations}
+
+    monkeypatch.setattr(tbot.Config, "COALESCE_MESSAGES", True)
+    monkeypatch.setattr(tbot.Notifier, "submit", staticmethod(fake_submit))
+    batch = [("x" * 5000, ["telegram"]), ("short", ["lark"])]
+
+    assert list(tbot.Notifier.send_many(batch)) == [{"telegram": False}, {"lark": True}]
+    assert len(sent) == 3
+
+
+def test_record_results_keeps_failed_split_message_pending(tmp_path, monkeypatch, tbot):
+    monkeypatch.setattr(tbot.Config, "LEDGER_LEGACY_PATH", str(tmp_path / "missing.sqlite3"))
+    ledger = tbot.DeliveryLedger(str(tmp_path))
+    monkeypatch.setattr(tbot, "_ledger", ledger)
+    results = iter([False, True])
+    monkeypatch.setattr(tbot.Notifier, "submit",
+                        staticmethod(lambda message, destinations: {d: done(next(results)) for d in destinations}))
+    outbox = [(1, "tweet-1", "y" * 5000, ["telegram"])]
+
+    tbot.record_results(outbox, tbot.Notifier.send_many([(m, c) for _, _, m, c in outbox]))
+
+    assert ledger.pending_channels("tweet-1", ["telegram"]) == ["telegram"]
+
+
+def test_ledger_appends_and_seals_previous_month(tmp_path, monkeypatch, tbot):
+    monkeypatch.setattr(tbot.Config, "LEDGER_LEGACY_PATH", str(tmp_path / "missing.sqlite3"))
+    old_log = tmp_path / "delivery_ledger_2000-01.jsonl"
+    old_log.write_text(
+        '{"tweet_key": "a", "channel": "telegram", "status": 0, "updated_at": "t1"}\n'
+        '{"tweet_key": "a", "channel": "telegram", "status": 1, "updated_at": "t2"}\n'
+        '{"tweet_key": "b", "channel": "lark", "status": 0, "updated_at": "t1"}\n'
+        '{"tweet_key": "b", "chan', encoding="utf-8")
+
+    ledger = tbot.DeliveryLedger(str(tmp_path))
+    assert not old_log.exists()
+    sealed = (tmp_path / "delivery_ledger_2000-01.sealed.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(sealed) == 2
+    assert ledger.pending_channels("a", ["telegram", "lark"]) == ["lark"]
+    assert ledger.pending_channels("b", ["lark"]) == ["lark"]
+
+    ledger.record("b", {"lark": True})
+    ledger.close()
+    reopened = tbot.DeliveryLedger(str(tmp_path))
+    assert reopened.pending_channels("b", ["lark"]) == []
+    assert reopened._records[("a", "telegram")][1] == 2
+    reopened.close()
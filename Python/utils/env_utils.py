@@ -0,0 +1,29 @@
+import os
+import sys
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils.log_utils import LogUtils
+
+logger = LogUtils().get_logger()
+
+
+def env_number(name, default, minimum=None, cast=int):
+    """
+    读取数值型环境变量
+    未设置时返回默认值；格式错误或小于 minimum 时记录警告并回退到默认值，不中断运行
+    """
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        logger.warning(f"⚠️ 环境变量 {name}={raw!r} 不是有效数值，使用默认值 {default}")
+        return default
+    if minimum is not None and value < minimum:
+        logger.warning(f"⚠️ 环境变量 {name}={raw!r} 小于 {minimum}，使用默认值 {default}")
+        return default
+    return value
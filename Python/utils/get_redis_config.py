@@ -1,5 +1,4 @@
 import os
-import json
 import sys
 import redis
 from redis.exceptions import RedisError
@@ -9,6 +8,7 @@ from pathlib import Path
 _project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(_project_root))
 from utils.log_utils import LogUtils
+from utils import json_utils
 
 logger = LogUtils().get_logger()
 logger.info("🔄 Get_Redis_Config 初始化完成")
@@ -24,9 +24,9 @@ def main():
 
     # 解析Redis配置
     try:
-        config = json.loads(redis_config)
+        config = json_utils.loads(redis_config)
         logger.info("✓ Redis配置解析成功")
-    except json.JSONDecodeError as e:
+    except json_utils.JSONDecodeError as e:
         logger.warning(f"⚠ 警告：Redis配置JSON格式错误（{e}），使用本地配置")
         sys.exit(0)
 
@@ -57,9 +57,9 @@ def main():
 
     # 解析配置数据
     try:
-        json_obj = json.loads(config_data)
+        json_obj = json_utils.loads(config_data)
         logger.info("✓ 配置数据格式验证成功")
-    except json.JSONDecodeError as e:
+    except json_utils.JSONDecodeError as e:
         logger.warning(f"⚠ 警告：配置数据JSON格式错误（{e}），使用本地配置")
         sys.exit(0)
 
@@ -68,7 +68,7 @@ def main():
     try:
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(json_obj, f, indent=2, ensure_ascii=False)
+            json_utils.dump(json_obj, f, pretty=json_utils.pretty_for("config"))
         logger.info(f"✓ 配置文件已生成：{os.path.abspath(file_path)}")
     except IOError as e:
         logger.warning(f"⚠ 警告：文件写入失败（{e}），使用现有配置")
@@ -0,0 +1,124 @@
+import os
+import json
+
+# 可选的高速JSON后端，未安装时回退到标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# 统一的解析异常类型（orjson 的异常为其子类，ujson 的异常在 loads 中转换）
+JSONDecodeError = json.JSONDecodeError
+
+# 各类文件的格式化策略：True 为缩进输出（便于人工查看），False 为紧凑输出
+PRETTY_POLICY = {
+    "output": True,  # 每日输出文件，下游与人工查看
+    "shard": True,  # 封存分片
+    "config": True,  # 配置文件
+    "segment": False,  # 输出增量段、重试队列等逐行记录
+    "state": False,  # 事务日志、过滤器头等内部状态
+    "message": False,  # 推送请求体
+}
+
+
+def pretty_for(kind):
+    """查询某类文件是否缩进输出"""
+    return PRETTY_POLICY.get(kind, False)
+
+
+# --------------------
+# 各后端实现
+# --------------------
+def _std_loads(data):
+    return json.loads(data)
+
+
+def _std_dumps(obj, pretty=False):
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def _orjson_loads(data):
+    return orjson.loads(data)
+
+
+def _orjson_dumps(obj, pretty=False):
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+    try:
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    except TypeError:
+        # 超出64位的整数等 orjson 不支持的类型交给标准库
+        return _std_dumps(obj, pretty)
+
+
+def _ujson_loads(data):
+    try:
+        return ujson.loads(data)
+    except ValueError as e:
+        raise JSONDecodeError(str(e), data if isinstance(data, str) else "", 0) from e
+
+
+def _ujson_dumps(obj, pretty=False):
+    return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, indent=2 if pretty else 0)
+
+
+_BACKENDS = {"json": (_std_loads, _std_dumps)}
+if ujson is not None:
+    _BACKENDS["ujson"] = (_ujson_loads, _ujson_dumps)
+if orjson is not None:
+    _BACKENDS["orjson"] = (_orjson_loads, _orjson_dumps)
+
+
+def available_backends():
+    """已安装的后端，按速度优先级排列"""
+    return [name for name in ("orjson", "ujson", "json") if name in _BACKENDS]
+
+
+def use_backend(name=None):
+    """切换后端；未指定时读取 JSON_BACKEND 环境变量，否则自动选择最快的可用后端"""
+    global BACKEND, _loads, _dumps
+    name = name or os.getenv("JSON_BACKEND") or available_backends()[0]
+    if name not in _BACKENDS:
+        raise ValueError(f"JSON后端不可用: {name} (可用: {available_backends()})")
+    BACKEND = name
+    _loads, _dumps = _BACKENDS[name]
+    return name
+
+
+# --------------------
+# 对外接口
+# --------------------
+def loads(data):
+    """解析 str 或 bytes"""
+    return _loads(data)
+
+
+def dumps(obj, pretty=False):
+    """序列化为 str（非ASCII字符原样输出）"""
+    return _dumps(obj, pretty)
+
+
+def dumpb(obj, pretty=False):
+    """序列化为 UTF-8 bytes"""
+    return _dumps(obj, pretty).encode("utf-8")
+
+
+def load(f):
+    """从文本或二进制文件对象读取"""
+    return _loads(f.read())
+
+
+def dump(obj, f, pretty=False):
+    """写入文本文件对象"""
+    f.write(_dumps(obj, pretty))
+
+
+BACKEND = None
+_loads = _dumps = None
+use_backend()
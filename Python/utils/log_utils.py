@@ -29,6 +29,10 @@ class LogUtils:
         """
         self.logger = logging.getLogger(name)
 
+        # 同一进程内多个脚本共用日志器时，避免重复添加处理器
+        if self.logger.handlers:
+            return
+
         config_path = project_root / "config" / "config.json"
 
         # 读取控制台日志级别
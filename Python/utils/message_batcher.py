@@ -0,0 +1,119 @@
+import sys
+import time
+import threading
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils.log_utils import LogUtils
+
+logger = LogUtils().get_logger()
+
+PACK_SEPARATOR = "\n\n━━━━━━━━━━\n\n"  # 合并消息之间的分隔线
+
+
+def utf16_len(text):
+    """Telegram 按 UTF-16 码元计算消息长度"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def utf8_len(text):
+    """飞书按 UTF-8 字节计算请求体大小"""
+    return len(text.encode("utf-8"))
+
+
+# 各渠道单条消息上限：(上限, 计量函数)
+MESSAGE_LIMITS = {
+    "telegram": (4096, utf16_len),
+    "lark": (20000, utf8_len),  # 飞书文本消息请求体建议不超过30KB，预留JSON结构余量
+}
+
+
+def split_text(text, limit, measure=len):
+    """将超出上限的单条消息按上限切分为多段"""
+    parts = []
+    while measure(text) > limit:
+        # 二分查找不超过上限的最长前缀，优先在换行处断开
+        low, high = 1, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if measure(text[:mid]) <= limit:
+                low = mid
+            else:
+                high = mid - 1
+        cut = text.rfind("\n", 0, low)
+        cut = cut if cut > low // 2 else low
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+def pack_messages(messages, limit, measure=len, max_items=None, separator=PACK_SEPARATOR):
+    """
+    按顺序将多条消息合并为不超过上限的若干条
+    返回 [(合并后的文本, 包含的原消息序号列表)]；超出上限的单条消息切分后各段单独发送
+    """
+    packs = []
+    texts, indices, size = [], [], 0
+    sep_size = measure(separator)
+
+    def close():
+        if texts:
+            packs.append((separator.join(texts), indices))
+
+    for index, message in enumerate(messages):
+        length = measure(message)
+        if length > limit:
+            close()
+            texts, indices, size = [], [], 0
+            packs.extend((part, [index]) for part in split_text(message, limit, measure))
+            continue
+        if texts and (size + sep_size + length > limit or (max_items and len(texts) >= max_items)):
+            close()
+            texts, indices, size = [], [], 0
+        size += length + (sep_size if texts else 0)
+        texts.append(message)
+        indices.append(index)
+    close()
+    return packs
+
+
+class AlertDigest:
+    """
+    通知摘要：时间窗口内的多条通知合并为一条消息发送
+    窗口自第一条待发通知起计算，窗口为0时逐条发送；运行结束时须调用 flush
+    """
+
+    def __init__(self, send, window, limit=4096, measure=len, separator="\n"):
+        self.send = send  # 发送函数：接收文本，返回是否成功
+        self.window = window
+        self.limit = limit
+        self.measure = measure
+        self.separator = separator
+        self._items = []
+        self._started = None
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        """加入一条通知，窗口已到期时立即发送全部待发通知"""
+        with self._lock:
+            if not self._items:
+                self._started = time.monotonic()
+            self._items.append(text)
+            due = self.window <= 0 or time.monotonic() - self._started >= self.window
+        return self.flush() if due else True
+
+    def flush(self):
+        """发送全部待发通知，返回是否全部成功"""
+        with self._lock:
+            items, self._items = self._items, []
+        if not items:
+            return True
+        ok = True
+        for text, _ in pack_messages(items, self.limit, self.measure, separator=self.separator):
+            ok = self.send(text) and ok
+        if len(items) > 1:
+            logger.info(f"📦 已合并 {len(items)} 条通知为摘要发送")
+        return ok
@@ -0,0 +1,422 @@
+import os
+import sys
+import heapq
+import hashlib
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils.log_utils import LogUtils
+from utils import json_utils
+from utils.perf_utils import recorder as perf
+
+try:
+    import msgpack  # 可选依赖，用于二进制输出格式
+except ImportError:
+    msgpack = None
+
+logger = LogUtils().get_logger()
+
+SAMPLE_SIZE = 64 * 1024  # 采样哈希读取的首尾字节数
+
+# 条目行的字段顺序（user 以用户表序号代替）
+ENTRY_FIELDS = (
+    "tweet_id", "file_name", "media_type", "url", "read_time", "is_uploaded",
+    "upload_info", "is_downloaded", "download_info", "full_text", "publish_time"
+)
+
+
+def sample_hash(f, size, sample_size=SAMPLE_SIZE):
+    """
+    文件大小与首尾各 sample_size 字节的哈希，不依赖修改时间（CI 重新检出后依然有效）
+    不大于 sample_size 的文件即为完整内容的哈希
+    """
+    digest = hashlib.sha1(str(size).encode("utf-8"))
+    f.seek(0)
+    digest.update(f.read(min(sample_size, size)))
+    if size > sample_size:
+        start = max(size - sample_size, sample_size)
+        f.seek(start)
+        digest.update(f.read(size - start))
+    return digest.hexdigest()
+
+
+def entry_id(entry):
+    """获取输出条目唯一标识"""
+    return f"{entry['file_name']}_{entry['user']['screen_name']}_{entry['media_type']}"
+
+
+def publish_time(entry):
+    """输出条目排序键"""
+    return entry.get("publish_time", "")
+
+
+def screen_name(entry):
+    """条目的用户名，兼容 X-Bot 输出（screen_name）与原始推文（screenName）结构，结构不符时为空字符串"""
+    user = entry.get("user")
+    if not isinstance(user, dict):
+        return ""
+    return (user.get("screenName") or user.get("screen_name") or "").strip()
+
+
+class JsonCodec:
+    """格式化JSON数组，兼容既有下游"""
+    suffix = ".json"
+
+    @staticmethod
+    def dump(entries, f):
+        """
+        逐条序列化后拼接为数组（与整体序列化的字节完全一致），返回每个条目的 (起始字节, 长度)
+        JSON字符串中的换行均已转义，缩进输出时可直接为每行补齐一级缩进
+        """
+        if not entries:
+            f.write(b"[]")
+            return []
+        pretty = json_utils.pretty_for("output")
+        head, sep, tail = (b"[\n  ", b",\n  ", b"\n]") if pretty else (b"[", b",", b"]")
+
+        parts, spans, pos = [head], [], len(head)
+        for i, e in enumerate(entries):
+            data = json_utils.dumpb(e, pretty=pretty)
+            if pretty:
+                data = data.replace(b"\n", b"\n  ")
+            if i:
+                parts.append(sep)
+                pos += len(sep)
+            parts.append(data)
+            spans.append((pos, len(data)))
+            pos += len(data)
+        parts.append(tail)
+        f.write(b"".join(parts))
+        return spans
+
+    @staticmethod
+    def load(f):
+        return json_utils.loads(f.read())
+
+
+class InternedCodec:
+    """
+    用户表内联的紧凑记录格式
+    用户信息首次出现时写入用户记录，条目按 ENTRY_FIELDS 顺序写为数组并以序号引用用户；
+    含额外字段的条目原样写为字典记录，保证读写往返一致
+    """
+    HEADER = {"format": "xbot-interned", "version": 1, "fields": list(ENTRY_FIELDS)}
+
+    @classmethod
+    def encode(cls, entries):
+        """将条目编码为记录序列"""
+        yield cls.HEADER
+        users = {}
+        for e in entries:
+            user = e.get("user")
+            if (not isinstance(user, dict) or user.keys() != {"screen_name", "name"}
+                    or len(e) != len(ENTRY_FIELDS) + 1 or any(k not in e for k in ENTRY_FIELDS)):
+                yield {"entry": e}
+                continue
+
+            user_key = (user["screen_name"], user["name"])
+            if user_key not in users:
+                users[user_key] = len(users)
+                yield {"user": user}
+            yield [users[user_key]] + [e[k] for k in ENTRY_FIELDS]
+
+    @staticmethod
+    def decode(records):
+        """将记录序列还原为条目"""
+        header = next(records, None)
+        if not isinstance(header, dict) or header.get("format") != "xbot-interned":
+            raise ValueError("无法识别的输出文件格式")
+
+        # 按模板顺序重建键：tweet_id、file_name、user、其余字段；同一用户的条目共享用户字典
+        fields = ["tweet_id", "file_name", "user"] + header["fields"][2:]
+        users, entries = [], []
+        for record in records:
+            if type(record) is list:
+                record[0], record[1], record[2] = record[1], record[2], users[record[0]]
+                entries.append(dict(zip(fields, record)))
+            elif "user" in record:
+                users.append(record["user"])
+            else:
+                entries.append(record["entry"])
+        return entries
+
+
+class InternedJsonlCodec(InternedCodec):
+    """用户表内联的紧凑JSON Lines"""
+    suffix = ".ijsonl"
+
+    @classmethod
+    def dump(cls, entries, f):
+        for record in cls.encode(entries):
+            f.write(json_utils.dumpb(record) + b"\n")
+
+    @classmethod
+    def load(cls, f):
+        # 拼接为单个数组一次解析，避免逐行调用解析器
+        lines = f.read().split(b"\n")
+        return cls.decode(iter(json_utils.loads(b"[" + b",".join(line for line in lines if line.strip()) + b"]")))
+
+
+class MsgpackCodec(InternedCodec):
+    """用户表内联的 msgpack 二进制流（需安装 msgpack）"""
+    suffix = ".msgpack"
+
+    @classmethod
+    def dump(cls, entries, f):
+        packer = msgpack.Packer(use_bin_type=True)
+        for record in cls.encode(entries):
+            f.write(packer.pack(record))
+
+    @classmethod
+    def load(cls, f):
+        return cls.decode(iter(msgpack.Unpacker(f, raw=False)))
+
+
+# 格式名 -> 编解码器
+CODECS = {"json": JsonCodec, "ijsonl": InternedJsonlCodec}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec
+
+# 读取时优先选择解析更快的格式
+READ_PREFERENCE = ("msgpack", "ijsonl", "json")
+
+
+class OutputStore:
+    """
+    每日输出文件的增量存储
+
+    基础文件为按发布时间排序的完整条目集，可同时写出多种格式（YYYY-MM-DD.json /
+    .ijsonl / .msgpack）；每次追加写入一个已排序的 NDJSON 增量段
+    （YYYY-MM-DD.d/NNNNNN.jsonl），读取时与基础文件归并，
+    段数达到上限或调用 compact 时合并回基础文件
+    """
+
+    SEGMENT_SUFFIX = ".jsonl"
+    BASE_SUFFIXES = (JsonCodec.suffix, InternedJsonlCodec.suffix, MsgpackCodec.suffix)
+    USER_INDEX_SUFFIX = ".uidx"  # 用户索引：用户名 -> JSON基础文件中各条目的字节区间
+
+    def __init__(self, path, max_segments=16, formats=("json",)):
+        path = str(path)
+        self.stem = os.path.splitext(path)[0] if path.endswith(self.BASE_SUFFIXES) else path
+        # JSON基础文件沿用调用方给出的路径，其他格式由其派生
+        self.path = path if not path.endswith(self.BASE_SUFFIXES[1:]) else self.stem + JsonCodec.suffix
+        self.segment_dir = self.stem + ".d"
+        self.user_index_path = self.stem + self.USER_INDEX_SUFFIX
+        self.max_segments = max_segments
+        self.formats = [fmt for fmt in formats if fmt in CODECS]
+        if len(self.formats) != len(formats):
+            logger.warning(f"⚠️ 忽略不可用的输出格式: {sorted(set(formats) - set(self.formats))}")
+        if not self.formats:
+            self.formats = ["json"]
+
+    def exists(self):
+        """基础文件或增量段是否存在"""
+        return any(os.path.exists(p) for p in self._base_paths()) or self.has_segments()
+
+    def has_segments(self):
+        """是否存在未合并的增量段"""
+        return bool(self._segments())
+
+    def append(self, entries):
+        """追加一批条目为新的已排序增量段，返回写入条数"""
+        if not entries:
+            if not self.exists():
+                self._write_base([])
+            return 0
+
+        segments = self._segments()
+        seq = int(os.path.splitext(os.path.basename(segments[-1]))[0]) + 1 if segments else 1
+        os.makedirs(self.segment_dir, exist_ok=True)
+        segment_path = os.path.join(self.segment_dir, f"{seq:06d}{self.SEGMENT_SUFFIX}")
+
+        with perf.stage("output_append", count=len(entries)) as stage:
+            lines = b"".join(json_utils.dumpb(e) + b"\n" for e in sorted(entries, key=publish_time))
+            self._write_atomic(segment_path, lambda f: f.write(lines))
+            stage.bytes = len(lines)
+        logger.info(f"💾 输出增量段已保存: {segment_path} (条目: {len(entries)})")
+
+        if len(segments) + 1 >= self.max_segments:
+            self.compact()
+        return len(entries)
+
+    def load(self):
+        """
+        归并基础文件与增量段，返回按发布时间排序的条目列表
+        增量段中与先前内容重复的条目被丢弃；无增量段时原样返回基础文件内容
+        """
+        return self._merge_segments(self._read_base())
+
+    def load_users(self, screen_names):
+        """
+        只读取指定用户的条目（不区分大小写），按发布时间排序
+        用户索引与JSON基础文件一致（大小与首尾采样哈希相同）时只解析目标用户的条目，否则完整读取后筛选；
+        非条目列表结构（如手动指定的其他JSON文件）原样返回
+        """
+        wanted = {name.lower() for name in screen_names}
+        base = self._read_base_users(wanted)
+        if base is None:
+            data = self.load()
+            if not isinstance(data, list):
+                return data
+            return [e for e in data if isinstance(e, dict) and screen_name(e).lower() in wanted]
+        return self._merge_segments(base, wanted)
+
+    def _merge_segments(self, base, wanted=None):
+        """归并增量段，丢弃与先前内容重复的条目；wanted 为小写用户名集合时只保留这些用户"""
+        segments = self._segments()
+        if not segments:
+            return base
+
+        seen = {entry_id(e) for e in base}
+        runs = [base]
+        for segment_path in segments:
+            run = [
+                e for e in self._read_segment(segment_path)
+                if entry_id(e) not in seen and (wanted is None or screen_name(e).lower() in wanted)
+            ]
+            seen.update(entry_id(e) for e in run)
+            runs.append(run)
+        return list(heapq.merge(*runs, key=publish_time))
+
+    def entry_ids(self):
+        """全部已保存条目的ID集合"""
+        return {entry_id(e) for e in self.load()}
+
+    def compact(self):
+        """将增量段合并回基础文件"""
+        segments = self._segments()
+        if not segments:
+            return
+
+        with perf.stage("output_compact") as stage:
+            merged = self.load()
+            self._write_base(merged)
+            stage.count = len(merged)
+            stage.bytes = sum(os.path.getsize(p) for p in self._base_paths() if os.path.exists(p))
+        # 基础文件已包含全部段内容，此后中断也只会在读取时被去重
+        for segment_path in segments:
+            os.remove(segment_path)
+        try:
+            os.rmdir(self.segment_dir)
+        except OSError:
+            pass
+        logger.info(f"🗜️ 输出文件已压缩: {self.path} (合并段: {len(segments)} | 总数: {len(merged)})")
+
+    @classmethod
+    def discover(cls, base_dir):
+        """列出目录下全部输出文件路径（按 .json 路径归一，含仅有增量段或其他格式的输出）"""
+        base = Path(base_dir)
+        paths = set()
+        for suffix in cls.BASE_SUFFIXES:
+            paths.update(p.with_suffix(JsonCodec.suffix) for p in base.rglob(f"*{suffix}"))
+        for segment_dir in base.rglob("*.d"):
+            if segment_dir.is_dir() and any(segment_dir.glob(f"*{cls.SEGMENT_SUFFIX}")):
+                paths.add(segment_dir.with_suffix(JsonCodec.suffix))
+        return sorted(paths)
+
+    def _base_path(self, suffix):
+        """指定格式的基础文件路径"""
+        return self.path if suffix == JsonCodec.suffix else self.stem + suffix
+
+    def _base_paths(self):
+        return [self._base_path(suffix) for suffix in self.BASE_SUFFIXES]
+
+    def _segments(self):
+        """按序号排列的增量段路径"""
+        if not os.path.isdir(self.segment_dir):
+            return []
+        return sorted(
+            os.path.join(self.segment_dir, name)
+            for name in os.listdir(self.segment_dir)
+            if name.endswith(self.SEGMENT_SUFFIX)
+        )
+
+    def _read_base(self):
+        """按解析速度优先级读取现有基础文件"""
+        for fmt in READ_PREFERENCE:
+            codec = CODECS.get(fmt)
+            if codec is not None and os.path.exists(self._base_path(codec.suffix)):
+                with open(self._base_path(codec.suffix), "rb") as f:
+                    return codec.load(f)
+        if any(os.path.exists(p) for p in self._base_paths()):
+            raise RuntimeError(f"缺少读取输出文件所需的依赖: {self.stem}")
+        return []
+
+    @staticmethod
+    def _read_segment(segment_path):
+        with open(segment_path, "rb") as f:
+            return [json_utils.loads(line) for line in f if line.strip()]
+
+    def _read_base_users(self, wanted):
+        """按用户索引读取JSON基础文件中目标用户的条目，索引缺失或与基础文件不一致时返回None"""
+        if not os.path.exists(self.user_index_path) or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.user_index_path, "rb") as f:
+                index = json_utils.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # 条目区间按文件顺序（即发布时间顺序）读取，拼接后一次解析
+        spans = sorted(
+            span for name, user_spans in index["users"].items() if name.lower() in wanted
+            for span in user_spans
+        )
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if index.get("size") != size or index.get("sample_hash") != sample_hash(f, size):
+                return None
+            chunks = []
+            for start, length in spans:
+                f.seek(start)
+                chunks.append(f.read(length))
+        if not chunks:
+            return []
+        try:
+            entries = json_utils.loads(b"[" + b",".join(chunks) + b"]")
+        except ValueError:
+            return None
+        # 采样之外的内容被改写时区间可能错位，解析结果须全部属于目标用户
+        if not all(isinstance(e, dict) and screen_name(e).lower() in wanted for e in entries):
+            return None
+        return entries
+
+    def _write_user_index(self, entries, spans):
+        """写出JSON基础文件的用户索引，记录基础文件的大小与首尾采样哈希用于校验"""
+        users = {}
+        for e, span in zip(entries, spans):
+            users.setdefault(screen_name(e), []).append(span)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            index = {"version": 2, "size": size, "sample_hash": sample_hash(f, size), "users": users}
+        self._write_atomic(
+            self.user_index_path, lambda f: f.write(json_utils.dumpb(index, pretty=json_utils.pretty_for("state")))
+        )
+
+    def _write_base(self, entries):
+        """写出全部配置格式的基础文件（JSON格式附带用户索引），并删除未配置格式的旧文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        written = set()
+        for fmt in self.formats:
+            codec = CODECS[fmt]
+            spans = self._write_atomic(self._base_path(codec.suffix), lambda f: codec.dump(entries, f))
+            written.add(self._base_path(codec.suffix))
+            if codec is JsonCodec:
+                self._write_user_index(entries, spans)
+                written.add(self.user_index_path)
+        for path in self._base_paths() + [self.user_index_path]:
+            if path not in written and os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _write_atomic(path, write):
+        """先写临时文件再替换，保证整体提交；返回写入函数的返回值"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            result = write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return result
@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils.log_utils import LogUtils
+from utils import json_utils
+
+logger = LogUtils().get_logger()
+
+# 指标与剖析结果输出目录（与日志同目录）
+METRICS_DIR = _project_root / "logs"
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+class StageHandle:
+    """阶段内累加处理条数与字节数"""
+    __slots__ = ("count", "bytes")
+
+    def __init__(self, count=0, nbytes=0):
+        self.count = count
+        self.bytes = nbytes
+
+
+class PerfRecorder:
+    """
+    分阶段性能记录器
+    记录各阶段的调用次数、总耗时、自身耗时（扣除嵌套子阶段）、处理条数与字节数，
+    可选开启 cProfile / tracemalloc 剖析
+    """
+
+    def __init__(self):
+        self._stats = {}  # 阶段名 -> 统计，按首次出现顺序排列
+        self._lock = threading.Lock()
+        self._local = threading.local()  # 每个线程的阶段栈（记录子阶段累计耗时）
+        self._profile_mode = None
+        self._profiler = None
+        self._started = time.perf_counter()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def record(self, name, seconds, count=0, nbytes=0, calls=1, self_seconds=None):
+        """累加一次阶段记录，并计入外层阶段的子阶段耗时"""
+        with self._lock:
+            stat = self._stats.setdefault(name, {"calls": 0, "seconds": 0.0, "self_seconds": 0.0, "count": 0, "bytes": 0})
+            stat["calls"] += calls
+            stat["seconds"] += seconds
+            stat["self_seconds"] += seconds if self_seconds is None else self_seconds
+            stat["count"] += count
+            stat["bytes"] += nbytes
+        stack = self._stack()
+        if stack:
+            stack[-1] += seconds
+
+    @contextmanager
+    def stage(self, name, count=0, nbytes=0):
+        """计时一个阶段，可通过返回的句柄累加条数与字节数"""
+        handle = StageHandle(count, nbytes)
+        stack = self._stack()
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            elapsed = time.perf_counter() - start
+            child = stack.pop()
+            self.record(name, elapsed, handle.count, handle.bytes, self_seconds=elapsed - child)
+
+    def timed_iter(self, name, iterable, nbytes=0):
+        """包装迭代器，只统计取下一个元素所花的时间（如流式解析）"""
+        total, count = 0.0, 0
+        it = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                finally:
+                    total += time.perf_counter() - start
+                count += 1
+                yield item
+        finally:
+            self.record(name, total, count, nbytes, calls=1)
+
+    def stats(self):
+        """各阶段统计快照"""
+        with self._lock:
+            return {name: dict(stat) for name, stat in self._stats.items()}
+
+    # --------------------
+    # 剖析开关
+    # --------------------
+    def start_profiling(self, mode):
+        """开启 cProfile 或 tracemalloc 剖析"""
+        if not mode:
+            return
+        if mode not in PROFILE_MODES:
+            logger.warning(f"⚠️ 未知的剖析模式: {mode} (可选: {', '.join(PROFILE_MODES)})")
+            return
+        self._profile_mode = mode
+        if mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            tracemalloc.start()
+        logger.info(f"🔬 已开启性能剖析: {mode}")
+
+    def stop_profiling(self, tag):
+        """停止剖析并输出结果，返回写入指标文件的剖析摘要"""
+        mode, self._profile_mode = self._profile_mode, None
+        if mode == "cprofile":
+            self._profiler.disable()
+            METRICS_DIR.mkdir(parents=True, exist_ok=True)
+            path = METRICS_DIR / f"{tag}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof"
+            self._profiler.dump_stats(str(path))
+            self._profiler = None
+            lines = []
+            for (file, line, func), (_, ncalls, _, cumtime, _) in sorted(
+                    pstats.Stats(str(path)).stats.items(), key=lambda kv: kv[1][3], reverse=True)[:15]:
+                lines.append(f"  {cumtime:8.3f}s {ncalls:>8} {os.path.basename(file)}:{line}({func})")
+            logger.info(f"🔬 cProfile 结果已保存: {path}\n累计耗时前15:\n" + "\n".join(lines))
+            return {"mode": mode, "profile_path": str(path)}
+        if mode == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = [f"  {stat.size / 1024:10.1f}KB {stat.count:>8} {stat.traceback}"
+                     for stat in snapshot.statistics("lineno")[:10]]
+            logger.info(f"🔬 tracemalloc 峰值内存: {peak / 2 ** 20:.1f}MB\n内存占用前10:\n" + "\n".join(lines))
+            return {"mode": mode, "current_bytes": current, "peak_bytes": peak}
+        return None
+
+    # --------------------
+    # 报告
+    # --------------------
+    def summary_table(self):
+        """各阶段统计表"""
+        stats = self.stats()
+        header = f"{'阶段':<16}{'调用':>8}{'总耗时(s)':>12}{'自身(s)':>10}{'条数':>10}{'字节':>12}{'条/秒':>12}"
+        lines = [header, "-" * len(header)]
+        for name, s in stats.items():
+            throughput = f"{s['count'] / s['seconds']:.0f}" if s["count"] and s["seconds"] else "-"
+            lines.append(
+                f"{name:<16}{s['calls']:>8}{s['seconds']:>12.3f}{s['self_seconds']:>10.3f}"
+                f"{s['count']:>10}{s['bytes']:>12}{throughput:>12}"
+            )
+        lines.append(f"总运行时间: {time.perf_counter() - self._started:.3f}s")
+        return "\n".join(lines)
+
+    def log_summary(self):
+        """输出统计表"""
+        if self._stats:
+            logger.info(f"⏱️ 阶段耗时统计:\n{self.summary_table()}")
+
+    def write_metrics(self, tag, extra=None):
+        """追加一行运行指标到 logs/metrics-YYYY-MM-DD.jsonl，便于跟踪趋势"""
+        METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        path = METRICS_DIR / f"metrics-{datetime.now().strftime('%Y-%m-%d')}.jsonl"
+        record = {
+            "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            "script": tag,
+            "wall_seconds": round(time.perf_counter() - self._started, 4),
+            "stages": {
+                name: {k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()}
+                for name, s in self.stats().items()
+            },
+            **(extra or {})
+        }
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json_utils.dumps(record, pretty=json_utils.pretty_for("segment")) + "\n")
+        logger.info(f"📈 运行指标已写入: {path}")
+        return path
+
+    def finish(self, tag, extra=None):
+        """结束剖析并输出统计表与指标文件"""
+        profile = self.stop_profiling(tag)
+        self.log_summary()
+        extra = dict(extra or {})
+        if profile:
+            extra["profile"] = profile
+        return self.write_metrics(tag, extra)
+
+
+# 进程内共享的记录器
+recorder = PerfRecorder()
@@ -0,0 +1,259 @@
+import os
+import sys
+import time
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils.log_utils import LogUtils
+from utils import json_utils
+
+try:
+    from telegram import error as telegram_error
+except ImportError:  # 未安装 python-telegram-bot 时不注册 Telegram 错误分类
+    telegram_error = None
+
+logger = LogUtils().get_logger()
+
+# 各渠道限速（条/秒）：(渠道速率, 渠道突发, 单会话速率, 单会话突发)
+CHANNEL_LIMITS = {
+    "telegram": (25, 25, 1, 3),
+    "lark": (100 / 60, 5, 100 / 60, 5),
+}
+
+
+class RateLimited(Exception):
+    """发送被限流，retry_after 为服务端要求的等待秒数（未知时为None）"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PermanentError(Exception):
+    """不可重试的发送错误（如请求参数错误、鉴权失败），立即放弃且不写入重试队列"""
+
+
+def telegram_permanent(error):
+    """Telegram 不可重试的错误：请求错误（含消息格式错误、会话不存在）、鉴权失败、会话已迁移"""
+    if telegram_error is None:
+        return False
+    return isinstance(error, (telegram_error.BadRequest, telegram_error.Unauthorized,
+                              telegram_error.InvalidToken, telegram_error.ChatMigrated))
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # 每秒补充的令牌数
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到取得一个令牌，返回等待秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """服务端要求等待时清空令牌，让后续发送一起让路"""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class RetryQueue:
+    """持久化重试队列（JSON Lines），进程重启后可重放"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def push(self, item):
+        """追加一条待重试消息"""
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json_utils.dumps(item, pretty=json_utils.pretty_for("segment")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def drain(self):
+        """取出全部待重试消息并清空队列"""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return []
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = [json_utils.loads(line) for line in f if line.strip()]
+            os.remove(self.path)
+        return items
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+
+
+class SendScheduler:
+    """
+    限流感知的发送调度器
+    按渠道与会话两级令牌桶控速，遵循 retry_after，其余错误按带抖动的指数退避重试，
+    重试耗尽后写入持久化重试队列（可选）；不可重试的错误立即放弃，
+    队列中的消息重放超过 max_replays 次后丢弃
+    """
+
+    def __init__(self, queue_path=None, max_attempts=5, base_delay=1.0, max_delay=60.0, max_replays=3):
+        self.max_attempts = max_attempts
+        self.max_replays = max_replays
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue = RetryQueue(queue_path) if queue_path else None
+        self._limits = {}  # 渠道 -> (速率, 容量, 会话速率, 会话容量)
+        self._buckets = {}  # (渠道, 会话) -> TokenBucket
+        self._senders = {}  # 渠道 -> 发送函数，用于重放持久化队列
+        self._permanent = {}  # 渠道 -> 判断异常是否不可重试
+        self._lock = threading.Lock()
+        self._stats = {"sent": 0, "failed": 0, "retries": 0, "rate_limited": 0, "dropped": 0, "in_flight": 0}
+        self._throttle = {}  # 渠道 -> 累计限流等待秒数
+
+    def register_channel(self, channel, sender, rate, burst, chat_rate, chat_burst, is_permanent=None):
+        """
+        注册渠道的发送函数与限速参数（速率单位：条/秒）
+        is_permanent 判断渠道特有的不可重试异常，PermanentError 始终视为不可重试
+        """
+        self._limits[channel] = (rate, burst, chat_rate, chat_burst)
+        self._senders[channel] = sender
+        self._permanent[channel] = is_permanent or (lambda error: False)
+        self._throttle.setdefault(channel, 0.0)
+
+    def _bucket(self, channel, chat=None):
+        """获取渠道级（chat为None）或会话级令牌桶"""
+        key = (channel, chat)
+        with self._lock:
+            if key not in self._buckets:
+                rate, burst, chat_rate, chat_burst = self._limits[channel]
+                self._buckets[key] = TokenBucket(rate, burst) if chat is None else TokenBucket(chat_rate, chat_burst)
+            return self._buckets[key]
+
+    def _add_stat(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def _add_throttle(self, channel, seconds):
+        with self._lock:
+            self._throttle[channel] += seconds
+
+    def is_permanent(self, channel, error):
+        """异常是否不可重试"""
+        return isinstance(error, PermanentError) or self._permanent[channel](error)
+
+    def send(self, channel, chat, payload, queued=None, raise_permanent=False):
+        """
+        发送一条消息，返回是否成功
+        发送函数失败时应抛出异常，限流异常需带 retry_after 属性；queued 为重放的队列条目，
+        raise_permanent 为 True 时不可重试的异常原样抛出，由调用方处理（如拆开合并消息逐条重发）
+        """
+        sender = self._senders[channel]
+        channel_bucket, chat_bucket = self._bucket(channel), self._bucket(channel, str(chat))
+        self._add_stat("in_flight")
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                self._add_throttle(channel, channel_bucket.acquire() + chat_bucket.acquire())
+                try:
+                    sender(chat, payload)
+                    self._add_stat("sent")
+                    return True
+                except Exception as e:
+                    if self.is_permanent(channel, e):
+                        self._add_stat("dropped")
+                        logger.error(f"🚫 [{channel}] 发送失败且不可重试，已放弃: {str(e)}")
+                        if raise_permanent:
+                            raise
+                        return False
+                    retry_after = getattr(e, "retry_after", None)
+                    if retry_after is not None or isinstance(e, RateLimited):
+                        self._add_stat("rate_limited")
+                    if attempt == self.max_attempts:
+                        logger.error(f"❌ [{channel}] 发送失败，已重试 {attempt} 次: {str(e)}")
+                        break
+
+                    self._add_stat("retries")
+                    if retry_after is not None:
+                        # 暂停整个渠道的令牌桶，下次取令牌时等待，同渠道其他发送一并让路
+                        channel_bucket.pause(float(retry_after))
+                        logger.warning(f"⏳ [{channel}] 触发限流，按要求等待 {float(retry_after):.1f}s 后重试")
+                    else:
+                        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                        logger.warning(f"🔁 [{channel}] 发送失败，{delay:.1f}s 后第 {attempt + 1} 次尝试: {str(e)}")
+                        self._add_throttle(channel, delay)
+                        time.sleep(delay)
+
+            self._add_stat("failed")
+            if self.queue is not None:
+                now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+                self.queue.push({
+                    "channel": channel,
+                    "chat": chat,
+                    "payload": payload,
+                    "failed_at": now,
+                    "first_failed_at": queued.get("first_failed_at", now) if queued else now,
+                    "replays": queued.get("replays", 0) + 1 if queued else 0
+                })
+                logger.warning(f"📥 [{channel}] 消息已写入重试队列: {self.queue.path}")
+            return False
+        finally:
+            self._add_stat("in_flight", -1)
+
+    def replay(self):
+        """重放持久化队列中的消息，返回成功条数"""
+        if self.queue is None:
+            return 0
+        items = self.queue.drain()
+        if items:
+            logger.info(f"🔁 重放重试队列中的消息: {len(items)} 条")
+
+        succeeded = 0
+        for item in items:
+            if item["channel"] not in self._senders:
+                # 未注册的渠道原样放回队列
+                self.queue.push(item)
+                continue
+            if item.get("replays", 0) >= self.max_replays:
+                self._add_stat("dropped")
+                logger.error(f"🚫 [{item['channel']}] 消息已重放 {item['replays']} 次仍失败，已丢弃 "
+                             f"(首次失败: {item.get('first_failed_at', item.get('failed_at'))})")
+                continue
+            succeeded += self.send(item["channel"], item["chat"], item["payload"], queued=item)
+        return succeeded
+
+    def metrics(self):
+        """调度指标：发送统计、当前/持久化队列深度、各渠道限流等待时间"""
+        with self._lock:
+            metrics = dict(self._stats)
+            metrics["throttle_seconds"] = {k: round(v, 3) for k, v in self._throttle.items()}
+        metrics["queue_depth"] = len(self.queue) if self.queue is not None else 0
+        return metrics
+
+    def log_metrics(self):
+        """输出调度指标"""
+        m = self.metrics()
+        throttle = ", ".join(f"{k} {v:.1f}s" for k, v in m["throttle_seconds"].items()) or "无"
+        logger.info(
+            f"📊 发送调度统计: 成功 {m['sent']} | 失败 {m['failed']} | 重试 {m['retries']} | "
+            f"限流 {m['rate_limited']} | 放弃 {m['dropped']} | 发送中 {m['in_flight']} | 重试队列 {m['queue_depth']} | 限流等待 {throttle}"
+        )
@@ -0,0 +1,219 @@
+import os
+import sys
+from collections import deque
+from pathlib import Path
+
+# 将项目根目录添加到模块搜索路径
+_project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(_project_root))
+from utils.log_utils import LogUtils
+from utils import json_utils
+
+logger = LogUtils().get_logger()
+
+
+class AhoCorasick:
+    """多关键词匹配自动机：一次扫描文本找出全部出现的关键词，耗时与关键词数量无关"""
+
+    def __init__(self, keywords):
+        self._goto = [{}]  # 状态 -> {字符: 下一状态}
+        self._fail = [0]
+        self._out = [()]  # 状态 -> 以该状态结尾的关键词编号
+        self.keywords = []
+        for keyword in keywords:
+            self._add(keyword)
+        self._build()
+
+    def _add(self, keyword):
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (len(self.keywords),)
+        self.keywords.append(keyword)
+
+    def _build(self):
+        """按层序计算失配指针，并合并后缀状态的输出"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def search(self, text):
+        """返回文本中出现的关键词编号集合"""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class Subscription:
+    """单条订阅：各条件字段之间为"且"，字段内为"或"，未设置的字段不限制"""
+    __slots__ = ("index", "name", "screen_names", "keywords", "media_types", "destinations")
+
+    def __init__(self, index, name, screen_names, keywords, media_types, destinations):
+        self.index = index
+        self.name = name
+        self.screen_names = screen_names  # 小写用户名集合
+        self.keywords = keywords  # 小写关键词元组
+        self.media_types = media_types  # 媒体类型集合
+        self.destinations = destinations  # 推送目标，如 telegram / telegram:<chat_id> / lark / lark:<环境变量名>
+
+    @classmethod
+    def from_config(cls, index, raw, channels=None):
+        """从配置项构建，忽略不支持的渠道；缺少推送目标或匹配条件时返回None"""
+        def values(field):
+            value = raw.get(field) or []
+            return [value] if isinstance(value, str) else list(value)
+
+        name = raw.get("name") or f"#{index}"
+        destinations = tuple(dict.fromkeys(str(d) for d in values("channels")))
+        if channels is not None:
+            unknown = [d for d in destinations if d.partition(":")[0] not in channels]
+            if unknown:
+                logger.warning(f"⚠️ 订阅 {name} 包含不支持的渠道，已忽略: {unknown}")
+                destinations = tuple(d for d in destinations if d not in unknown)
+        screen_names = {v.strip().lower() for v in values("screen_names") if v.strip()}
+        keywords = tuple(dict.fromkeys(v.lower() for v in values("keywords") if v))
+        media_types = set(values("media_types"))
+        if not destinations:
+            logger.warning(f"⚠️ 订阅 {name} 未配置推送渠道，已忽略")
+            return None
+        if not (screen_names or keywords or media_types):
+            logger.warning(f"⚠️ 订阅 {name} 未配置任何匹配条件，已忽略")
+            return None
+        return cls(index, name, screen_names, keywords, media_types, destinations)
+
+
+class SubscriptionRouter:
+    """
+    订阅路由：将订阅表编译为哈希索引与关键词自动机，单次扫描为每条推文求出推送目标
+
+    每条订阅按一个主条件建立索引（用户名 > 关键词 > 媒体类型），
+    推文只需一次用户名查表、一次正文自动机扫描与一次媒体类型查表得到候选订阅，
+    再逐个校验候选订阅的其余条件，耗时基本不随订阅数量增长
+    """
+
+    def __init__(self, subscriptions):
+        self.subscriptions = subscriptions
+        self._by_user = {}
+        self._by_media = {}
+        self._by_keyword = {}  # 关键词编号 -> 以关键词为主条件的订阅
+        keyword_ids = {}
+        for sub in subscriptions:
+            for keyword in sub.keywords:
+                keyword_ids.setdefault(keyword, len(keyword_ids))
+            if sub.screen_names:
+                for name in sub.screen_names:
+                    self._by_user.setdefault(name, []).append(sub)
+            elif sub.keywords:
+                for keyword in sub.keywords:
+                    self._by_keyword.setdefault(keyword_ids[keyword], []).append(sub)
+            else:
+                for media_type in sub.media_types:
+                    self._by_media.setdefault(media_type, []).append(sub)
+        self._keyword_ids = {sub.index: {keyword_ids[k] for k in sub.keywords} for sub in subscriptions}
+        self._matcher = AhoCorasick(keyword_ids) if keyword_ids else None
+
+    @classmethod
+    def from_config(cls, config, channels=None):
+        """
+        从配置字典的 subscriptions 列表构建，每项格式为：
+        {"name": "...", "screen_names": [...], "keywords": [...], "media_types": ["images", "videos"],
+         "channels": ["telegram", "telegram:<chat_id>", "lark", "lark:<保存Webhook Key的环境变量名>"]}
+        """
+        subscriptions = []
+        for raw in config.get("subscriptions") or []:
+            sub = Subscription.from_config(len(subscriptions), raw, channels)
+            if sub is not None:
+                subscriptions.append(sub)
+        return cls(subscriptions)
+
+    @classmethod
+    def load(cls, path, channels=None):
+        """
+        读取配置文件中的订阅表（Redis中的配置由 get_redis_config 同步到该文件）
+        文件不存在或格式错误时返回空路由
+        """
+        try:
+            with open(path, "rb") as f:
+                config = json_utils.load(f)
+        except FileNotFoundError:
+            return cls([])
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 订阅配置读取失败: {path} | {e}")
+            return cls([])
+        router = cls.from_config(config if isinstance(config, dict) else {}, channels)
+        if router:
+            logger.info(f"📬 已加载订阅: {len(router.subscriptions)} 条 | 用户 {len(router._by_user)} | "
+                        f"关键词 {len(router._matcher.keywords) if router._matcher else 0}")
+        return router
+
+    def __bool__(self):
+        return bool(self.subscriptions)
+
+    def screen_names(self):
+        """全部订阅均限定用户时返回用户名集合（可按用户索引读取输出），否则返回None"""
+        if self._by_keyword or self._by_media:
+            return None
+        return set(self._by_user)
+
+    def route(self, screen_name, text, media_types):
+        """返回推文的推送目标列表（按订阅顺序去重）"""
+        screen_name = (screen_name or "").lower()
+        found = self._matcher.search((text or "").lower()) if self._matcher else set()
+
+        candidates = list(self._by_user.get(screen_name, ()))
+        for keyword_id in found:
+            candidates.extend(self._by_keyword.get(keyword_id, ()))
+        for media_type in media_types:
+            candidates.extend(self._by_media.get(media_type, ()))
+
+        matched = set()
+        for sub in candidates:
+            if sub.index in matched:
+                continue
+            if sub.screen_names and screen_name not in sub.screen_names:
+                continue
+            if sub.keywords and not (self._keyword_ids[sub.index] & found):
+                continue
+            if sub.media_types and not (sub.media_types & media_types):
+                continue
+            matched.add(sub.index)
+
+        destinations = {}
+        for index in sorted(matched):
+            for destination in self.subscriptions[index].destinations:
+                destinations.setdefault(destination, None)
+        return list(destinations)
+
+
+def resolve_destination(destination):
+    """
+    拆分推送目标为 (渠道, 目标)，目标省略时为None（使用渠道默认目标）
+    飞书目标为保存Webhook Key的环境变量名，避免密钥写入配置；变量未设置时为空字符串
+    """
+    channel, _, target = destination.partition(":")
+    if not target:
+        return channel, None
+    if channel == "lark":
+        return channel, os.getenv(target, "")
+    return channel, target
@@ -1,81 +1,220 @@
 import sys
 import os
 import shutil
+import hashlib
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 将项目根目录添加到模块搜索路径
 _project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(_project_root))
 from utils.log_utils import LogUtils
+from utils import json_utils
+from utils.env_utils import env_number
 
 logger = LogUtils().get_logger()
 logger.info("🔄 Sync_Data 初始化完成")
 
+MANIFEST_PATH = _project_root / "cache" / "sync_manifest.json"  # 同步清单，记录各目录树的文件指纹
+SYNC_WORKERS = 8  # 哈希、复制、删除的线程数，可由环境变量 SYNC_WORKERS 覆盖
+HASH_CHUNK_SIZE = 1024 * 1024
 
-def sync_dirs(source, dest):
-    """同步目录的核心函数"""
+
+class SyncManifest:
+    """
+    同步清单：按目录树记录 相对路径 -> [大小, 修改时间, 内容哈希]
+    大小与修改时间均未变化的文件直接复用记录的哈希，只有变化的文件需要重新读取
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = str(path)
+        self.base_dir = os.path.dirname(os.path.abspath(self.path))
+        self.trees = {}
+        self._dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "rb") as f:
+                    self.trees = json_utils.load(f).get("trees", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ 同步清单损坏，将重新计算哈希: {self.path} | {e}")
+
+    def _key(self, tree):
+        """以清单所在目录为基准的相对路径，整个仓库移动后仍然有效"""
+        return os.path.relpath(os.path.abspath(tree), self.base_dir)
+
+    def lookup(self, tree):
+        return self.trees.get(self._key(tree), {})
+
+    def update(self, tree, files):
+        key = self._key(tree)
+        if self.trees.get(key) != files:
+            self.trees[key] = files
+            self._dirty = True
+
+    def save(self):
+        """有变化时写入清单"""
+        if not self._dirty:
+            return
+        os.makedirs(self.base_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json_utils.dumpb({"version": 1, "trees": self.trees}, pretty=json_utils.pretty_for("state")))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+def scan_tree(root):
+    """单次遍历目录树，返回 ({相对路径: stat}, [相对目录路径])；目录不存在时均为空"""
+    files, dirs = {}, []
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except FileNotFoundError:
+            continue
+        with it:
+            for entry in it:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(rel)
+                    stack.append(rel)
+                elif entry.is_file():
+                    files[rel] = entry.stat()
+    return files, dirs
+
+
+def file_hash(path):
+    """分块计算文件内容的SHA-1"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TreeState:
+    """一侧目录树的扫描结果与哈希缓存"""
+
+    def __init__(self, root, manifest):
+        self.root = root
+        self.files, self.dirs = scan_tree(root)
+        cached = manifest.lookup(root) if manifest is not None else {}
+        self.hashes = {}  # 相对路径 -> 内容哈希，仅包含大小与修改时间均与清单一致的文件
+        for rel, stat in self.files.items():
+            record = cached.get(rel)
+            if record and record[0] == stat.st_size and record[1] == stat.st_mtime_ns:
+                self.hashes[rel] = record[2]
+
+    def compute(self, rels, pool):
+        """在线程池中计算缺失的哈希，返回计算的文件数"""
+        rels = [rel for rel in rels if rel not in self.hashes]
+        paths = [os.path.join(self.root, rel) for rel in rels]
+        for rel, digest in zip(rels, pool.map(file_hash, paths)):
+            self.hashes[rel] = digest
+        return len(rels)
+
+    def records(self):
+        return {rel: [stat.st_size, stat.st_mtime_ns, self.hashes[rel]]
+                for rel, stat in self.files.items() if rel in self.hashes}
+
+
+def copy_file(src_path, dest_path, digest=None):
+    """复制单个文件，返回 (目标文件的stat, 内容哈希)；未提供哈希时顺带计算，供清单记录"""
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    shutil.copy2(src_path, dest_path)
+    return os.stat(dest_path), digest or file_hash(dest_path)
+
+
+def sync_dirs(source, dest, manifest=None, pool=None):
+    """
+    同步目录的核心函数
+    两侧目录树各遍历一次；大小相同的文件比较内容哈希（git检出会重置修改时间，不能据此判断），
+    哈希优先取自同步清单，复制与删除在线程池中并行执行
+    """
     # 标准化路径并确保末尾没有斜杠
     source = os.path.normpath(source)
     dest = os.path.normpath(dest)
 
     # 确保源目录存在
-    if not os.path.exists(source):
+    if not os.path.isdir(source):
         raise FileNotFoundError(f"源目录不存在：'{source}'")
 
-    # 收集源目录中的所有文件相对路径
-    source_files = set()
-    for root, dirs, files in os.walk(source):
-        rel_path = os.path.relpath(root, source)
-        for file in files:
-            file_rel_path = os.path.join(rel_path, file) if rel_path != '.' else file
-            source_files.add(file_rel_path)
-
-    # 复制或更新文件到目标目录
-    for file_rel in source_files:
-        src_path = os.path.join(source, file_rel)
-        dest_path = os.path.join(dest, file_rel)
-        dest_dir = os.path.dirname(dest_path)
-
-        # 创建目标目录结构
-        os.makedirs(dest_dir, exist_ok=True)
-
-        # 检查是否需要复制（修改时间或大小不同）
-        if os.path.exists(dest_path):
-            src_stat = os.stat(src_path)
-            dest_stat = os.stat(dest_path)
-            if src_stat.st_mtime <= dest_stat.st_mtime and src_stat.st_size == dest_stat.st_size:
-                continue  # 文件相同，跳过复制
-
-        shutil.copy2(src_path, dest_path)
-        logger.debug(f"📥 已复制：{src_path} -> {dest_path}")
-
-    # 收集目标目录中的所有文件相对路径
-    dest_files = set()
-    for root, dirs, files in os.walk(dest):
-        rel_path = os.path.relpath(root, dest)
-        for file in files:
-            file_rel_path = os.path.join(rel_path, file) if rel_path != '.' else file
-            dest_files.add(file_rel_path)
-
-    # 删除目标中存在但源中不存在的文件
-    for file_rel in (dest_files - source_files):
-        file_path = os.path.join(dest, file_rel)
-        try:
-            os.remove(file_path)
-            logger.debug(f"🗑️ 已删除：{file_path}")
-        except Exception as e:
-            logger.error(f"⚠ 删除文件失败：{file_path} - {str(e)}")
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPoolExecutor(max_workers=SYNC_WORKERS)
+    try:
+        src = TreeState(source, manifest)
+        dst = TreeState(dest, manifest)
+
+        # 大小不同或目标缺失直接复制，大小相同时比较哈希
+        same_size = [rel for rel, stat in src.files.items()
+                     if rel in dst.files and dst.files[rel].st_size == stat.st_size]
+        hashed = src.compute(same_size, pool) + dst.compute(same_size, pool)
+        to_copy = [rel for rel in src.files
+                   if rel not in dst.files
+                   or dst.files[rel].st_size != src.files[rel].st_size
+                   or dst.hashes[rel] != src.hashes[rel]]
+        to_delete = [rel for rel in dst.files if rel not in src.files]
+
+        futures = {rel: pool.submit(copy_file, os.path.join(source, rel), os.path.join(dest, rel),
+                                    src.hashes.get(rel))
+                   for rel in to_copy}
+        deletions = {rel: pool.submit(os.remove, os.path.join(dest, rel)) for rel in to_delete}
+
+        copied = 0
+        for rel, future in futures.items():
+            try:
+                dst.files[rel], dst.hashes[rel] = future.result()
+            except Exception as e:
+                logger.error(f"⚠ 复制文件失败：{os.path.join(source, rel)} - {str(e)}")
+                dst.files.pop(rel, None)
+                dst.hashes.pop(rel, None)
+                continue
+            copied += 1
+            src.hashes[rel] = dst.hashes[rel]
+            logger.debug(f"📥 已复制：{os.path.join(source, rel)} -> {os.path.join(dest, rel)}")
 
-    # 删除空目录（从叶子目录开始向上删除）
-    for root, dirs, files in os.walk(dest, topdown=False):
-        # 删除空目录
-        if not os.listdir(root):
+        deleted = 0
+        for rel, future in deletions.items():
+            file_path = os.path.join(dest, rel)
             try:
-                os.rmdir(root)
-                logger.debug(f"📁 已删除空目录：{root}")
+                future.result()
             except Exception as e:
-                logger.error(f"⚠ 删除目录失败：{root} - {str(e)}")
+                logger.error(f"⚠ 删除文件失败：{file_path} - {str(e)}")
+                continue
+            deleted += 1
+            del dst.files[rel]
+            dst.hashes.pop(rel, None)
+            logger.debug(f"🗑️ 已删除：{file_path}")
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+    # 删除源中没有文件的目录（从叶子目录开始向上删除）
+    needed = {""}
+    for rel in dst.files:
+        parent = rel.rpartition("/")[0]
+        while parent not in needed:
+            needed.add(parent)
+            parent = parent.rpartition("/")[0]
+    empty_dirs = sorted((d for d in dst.dirs if d not in needed), key=lambda d: d.count("/"), reverse=True)
+    if not dst.files and os.path.isdir(dest):
+        empty_dirs.append("")
+    for rel in empty_dirs:
+        dir_path = os.path.join(dest, rel) if rel else dest
+        try:
+            os.rmdir(dir_path)
+            logger.debug(f"📁 已删除空目录：{dir_path}")
+        except Exception as e:
+            logger.error(f"⚠ 删除目录失败：{dir_path} - {str(e)}")
+
+    if manifest is not None:
+        manifest.update(source, src.records())
+        manifest.update(dest, dst.records())
+    logger.info(f"✅ 同步完成：{source} => {dest} | 复制 {copied} | 删除 {deleted} | "
+                f"计算哈希 {hashed} | 文件总数 {len(src.files)}")
 
 
 def main():
@@ -112,15 +251,18 @@ def main():
 
     # 执行同步任务
     logger.info(f"🔄 正在执行任务组 [{args.task_group}]")
-    for task in TASK_GROUPS[args.task_group]:
-        src = task["source"]
-        dst = task["dest"]
-        logger.debug(f"→ 同步任务: {src} => {dst}")
-        try:
-            sync_dirs(src, dst)
-        except Exception as e:
-            logger.error(f"⚠ 同步失败：{src} => {dst} - {str(e)}")
-            continue
+    manifest = SyncManifest()
+    with ThreadPoolExecutor(max_workers=env_number("SYNC_WORKERS", SYNC_WORKERS, minimum=1)) as pool:
+        for task in TASK_GROUPS[args.task_group]:
+            src = task["source"]
+            dst = task["dest"]
+            logger.debug(f"→ 同步任务: {src} => {dst}")
+            try:
+                sync_dirs(src, dst, manifest, pool)
+            except Exception as e:
+                logger.error(f"⚠ 同步失败：{src} => {dst} - {str(e)}")
+                continue
+    manifest.save()
 
 
 if __name__ == "__main__":